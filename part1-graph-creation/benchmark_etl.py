@@ -0,0 +1,61 @@
+"""
+Runs process_imdb_data.py stage by stage on local PySpark and prints, for each
+stage, the wall time, shuffle bytes, spill and peak executor heap that the
+ETL records in its telemetry report. Pair it with generate_synthetic_imdb.py to
+benchmark the graph build without the licensed data or a Glue endpoint.
+
+    python generate_synthetic_imdb.py --titles 100000 --output ./synthetic-raw
+    python benchmark_etl.py --raw-data-path ./synthetic-raw --output-path ./synthetic-out
+
+Options not listed below are passed through to the ETL, e.g. --cache_intermediates false.
+Stages run one at a time unless --stage_parallelism is passed, so their metrics
+do not include each other's work.
+"""
+import argparse
+import json
+import os
+import sys
+
+from pyspark import SparkConf, SparkContext
+
+
+def mb(size):
+    return f"{size / 1024 / 1024:,.1f}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--raw-data-path", required = True)
+    parser.add_argument("--output-path",   required = True)
+    parser.add_argument("--master",        default = "local[*]")
+    parser.add_argument("--report",        default = None, help = "also write the results as JSON")
+    options, etl_options = parser.parse_known_args()
+
+    # The ETL reuses this context, which has the metrics polling the report relies on
+    conf = SparkConf().setMaster(options.master).setAppName("benchmark-etl")\
+                      .set("spark.scheduler.mode", "FAIR")\
+                      .set("spark.executor.metrics.pollingInterval", "100ms")
+    sc = SparkContext.getOrCreate(conf)
+
+    sys.argv = ["process_imdb_data.py",
+                "--JOB_NAME",           "benchmark-etl",
+                "--output_bucket_path", options.output_path,
+                "--raw_data_path",      options.raw_data_path] + etl_options
+    if "--stage_parallelism" not in etl_options:
+        sys.argv += ["--stage_parallelism", "1"]
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import process_imdb_data as etl
+
+    etl.main()
+    results = list(etl.stage_reports.values())
+
+    print(f"{'stage':<14}{'wall s':>9}{'jobs':>6}{'input MB':>11}{'output MB':>11}"
+          f"{'shuffle r MB':>14}{'shuffle w MB':>14}{'spill MB':>10}{'peak heap MB':>14}")
+    for r in results:
+        print(f"{r['stage']:<14}{r['wallSeconds']:>9.1f}{r['sparkJobs']:>6}{mb(r['inputBytes']):>11}"
+              f"{mb(r['outputBytes']):>11}{mb(r['shuffleReadBytes']):>14}{mb(r['shuffleWriteBytes']):>14}"
+              f"{mb(r['memoryBytesSpilled'] + r['diskBytesSpilled']):>10}{mb(r['peakJVMHeapBytes']):>14}")
+
+    if options.report:
+        with open(options.report, "w") as f:
+            json.dump(results, f, indent = 2)
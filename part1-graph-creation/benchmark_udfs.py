@@ -0,0 +1,103 @@
+"""
+Microbenchmark of the Python UDFs formerly used by process_imdb_data.py against
+the built-in column expressions that replaced them, on synthetic people and
+movie frames shaped like name_essential / title_essential.
+
+    python benchmark_udfs.py --rows 2000000 --repeat 3
+"""
+import argparse
+import time
+
+from pyspark.sql import SparkSession
+from pyspark.sql.functions import udf, col, lit, coalesce, exists, regexp_replace, expr
+from pyspark.sql.types import BooleanType
+
+
+# Before: row-at-a-time Python UDFs, as they were defined in process_imdb_data.py
+@udf
+def fixUdf(string):
+    return str(string).replace('"', "''")
+
+@udf(returnType=BooleanType())
+def oscarNomineeUdf(awards):
+    return any(a.awardName == "Oscar" for a in awards or [])
+
+@udf(returnType=BooleanType())
+def oscarWinnerUdf(awards):
+    return any(a.awardName == "Oscar" and a.winner for a in awards or [])
+
+
+# After: the built-in expressions now used by process_imdb_data.py
+def fix(column):
+    return regexp_replace(coalesce(col(column), lit("None")), '"', "''")
+
+def oscarNominee(column):
+    return coalesce(exists(column, lambda a: a.awardName == "Oscar"), lit(False))
+
+def oscarWinner(column):
+    return coalesce(exists(column, lambda a: (a.awardName == "Oscar") & a.winner.cast("boolean")), lit(False))
+
+
+def peopleFrame(spark, rows):
+    # 0 to 7 awards per person, a quarter of them Oscars, every third one won
+    awards = """transform(sequence(0, cast(id % 8 as int) - 1), i -> named_struct(
+                    'awardName', if((id + i) % 4 = 0, 'Oscar', 'Golden Globe'),
+                    'winner',    (id + i) % 3 = 0,
+                    'event',     concat('Event ', cast(i as string))))"""
+    return spark.range(rows).select(
+        expr("format_string('nm%07d', id)").alias("nameId"),
+        expr("""concat('Person "', cast(id as string), '"')""").alias("name"),
+        expr(f"if(id % 5 = 0, null, {awards})").alias("awards"))
+
+def movieFrame(spark, rows):
+    return spark.range(rows).select(
+        expr("format_string('tt%07d', id)").alias("titleId"),
+        expr("""if(id % 50 = 0, null, concat('The "', cast(id as string), '" Movie'))""").alias("originalTitle"))
+
+def timeSelect(df, *columns, repeat):
+    # The noop sink evaluates every column without paying for any output I/O
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        df.select(*columns).write.format("noop").mode("overwrite").save()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows",   type = int, default = 1000000)
+    parser.add_argument("--repeat", type = int, default = 3)
+    options = parser.parse_args()
+
+    spark = SparkSession.builder.appName("benchmark-udfs").getOrCreate()
+
+    people = peopleFrame(spark, options.rows).cache()
+    movies = movieFrame(spark, options.rows).cache()
+    people.count()
+    movies.count()
+
+    # Both variants must produce the same columns before their speed is compared
+    assert people.select(fixUdf("name"), oscarNomineeUdf("awards"), oscarWinnerUdf("awards"))\
+                 .exceptAll(people.select(fix("name"), oscarNominee("awards"), oscarWinner("awards"))).count() == 0
+    assert movies.select(fixUdf("originalTitle"))\
+                 .exceptAll(movies.select(fix("originalTitle"))).count() == 0
+
+    cases = [
+        ("dumpPerson: name, oscarNominee, oscarWinner", people,
+            [fixUdf("name"), oscarNomineeUdf("awards"), oscarWinnerUdf("awards")],
+            [fix("name"), oscarNominee("awards"), oscarWinner("awards")]),
+        ("dumpMovie: originalTitle", movies,
+            [fixUdf("originalTitle")],
+            [fix("originalTitle")]),
+    ]
+
+    print(f"{'frame':<46}{'udf rows/s':>14}{'native rows/s':>16}{'speedup':>10}")
+    for name, df, before, after in cases:
+        udf_seconds    = timeSelect(df, *before, repeat = options.repeat)
+        native_seconds = timeSelect(df, *after,  repeat = options.repeat)
+        print(f"{name:<46}{options.rows / udf_seconds:>14,.0f}{options.rows / native_seconds:>16,.0f}"
+              f"{udf_seconds / native_seconds:>9.1f}x")
+
+    spark.stop()
@@ -0,0 +1,156 @@
+"""
+Bulk loads the graph written by process_imdb_data.py into Neptune, following the
+load manifest the ETL writes next to it (<output_bucket_path>/load-manifest.json).
+
+Every label becomes one loader request, queued in manifest order: the node labels
+first, then each edge label with a dependency on the loads of the node labels it
+references, so Neptune runs them back to back without waiting on this script and
+never starts an edge load whose vertices failed.
+
+    python bulk_load.py --manifest s3://<bucket>/imdb/load-manifest.json \\
+                        --endpoint https://<cluster>:8182 --iam-role-arn <NeptuneLoadFromS3IAMRoleArn>
+
+--endpoint may be any HTTP server implementing the loader API, e.g. a local
+stand-in when testing; --iam-auth signs the requests for clusters with IAM auth.
+"""
+import argparse
+import json
+import sys
+import time
+from urllib.parse import urlparse
+
+import boto3
+import requests
+from botocore.auth import SigV4Auth
+from botocore.awsrequest import AWSRequest
+
+PARALLELISM = ["LOW", "MEDIUM", "HIGH", "OVERSUBSCRIBE"]
+PENDING     = {"LOAD_NOT_STARTED", "LOAD_IN_QUEUE", "LOAD_IN_PROGRESS"}
+# Neptune accepts at most 64 queued loads per cluster
+MAX_QUEUED  = 64
+
+
+class LoaderClient:
+    def __init__(self, endpoint, iam_auth = False, region = None):
+        self.endpoint = endpoint.rstrip("/")
+        self.session  = requests.Session()
+        self.iam_auth = iam_auth
+        self.region   = region or boto3.Session().region_name
+
+    def request(self, method, path, body = None):
+        url     = f"{self.endpoint}{path}"
+        data    = json.dumps(body) if body is not None else None
+        headers = {"Content-Type": "application/json"} if data else {}
+        if self.iam_auth:
+            request = AWSRequest(method = method, url = url, data = data, headers = headers)
+            credentials = boto3.Session().get_credentials().get_frozen_credentials()
+            SigV4Auth(credentials, "neptune-db", self.region).add_auth(request)
+            headers = dict(request.headers)
+        response = self.session.request(method, url, data = data, headers = headers)
+        response.raise_for_status()
+        return response.json()
+
+    def submit(self, body):
+        return self.request("POST", "/loader", body)["payload"]["loadId"]
+
+    def status(self, load_id):
+        return self.request("GET", f"/loader/{load_id}?details=true&errors=true")["payload"]
+
+
+def readManifest(path):
+    if path.startswith("s3://"):
+        url = urlparse(path)
+        return json.load(boto3.client("s3").get_object(Bucket = url.netloc, Key = url.path.lstrip("/"))["Body"])
+    with open(path) as f:
+        return json.load(f)
+
+def loadRequest(load, options, dependencies):
+    body = {"source"                           : load["source"],
+            "format"                           : options.format,
+            "iamRoleArn"                       : options.iam_role_arn,
+            "region"                           : options.region,
+            "failOnError"                      : "TRUE" if options.fail_on_error else "FALSE",
+            "parallelism"                      : options.parallelism,
+            "updateSingleCardinalityProperties": "TRUE" if options.update_single_cardinality else "FALSE",
+            "queueRequest"                     : "TRUE"}
+    if dependencies:
+        body["dependencies"] = dependencies
+    return body
+
+def submitLoads(client, manifest, options):
+    """
+    Queues one load per label in manifest order and returns {label: loadId}.
+    """
+    loads = manifest["loads"]
+    if len(loads) > MAX_QUEUED:
+        raise ValueError(f"{len(loads)} labels exceed the {MAX_QUEUED} loads Neptune can queue")
+
+    load_ids = {}
+    for load in loads:
+        unknown = [name for name in load["dependsOn"] if name not in load_ids]
+        if unknown:
+            raise ValueError(f"{load['name']} depends on {unknown}, which come later in the manifest")
+        body = loadRequest(load, options, [load_ids[name] for name in load["dependsOn"]])
+        load_ids[load["name"]] = client.submit(body)
+        print(f"Queued {load['name']:<28} {load['rows']:>12,} rows {load['bytes'] / 1024 / 1024:>10,.1f} MB"
+              f"  {load_ids[load['name']]}")
+    return load_ids
+
+def waitForLoads(client, load_ids, poll_seconds = 15, timeout = None):
+    """
+    Polls every load until it leaves the queue, printing each status change.
+    Returns {label: final status payload}.
+    """
+    deadline = time.time() + timeout if timeout else None
+    statuses = {}
+    pending  = dict(load_ids)
+    while pending:
+        for name, load_id in list(pending.items()):
+            payload = client.status(load_id)
+            status  = payload["overallStatus"]["status"]
+            if statuses.get(name, {}).get("overallStatus", {}).get("status") != status:
+                print(f"{name:<28} {status}")
+            statuses[name] = payload
+            if status not in PENDING:
+                del pending[name]
+        if pending:
+            if deadline and time.time() > deadline:
+                raise TimeoutError(f"Loads still running after {timeout}s: {sorted(pending)}")
+            time.sleep(poll_seconds)
+    return statuses
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--manifest",      required = True, help = "local path or s3:// URI of load-manifest.json")
+    parser.add_argument("--endpoint",      required = True, help = "e.g. https://<cluster>:8182")
+    parser.add_argument("--iam-role-arn",  required = True)
+    parser.add_argument("--region",        default = boto3.Session().region_name)
+    parser.add_argument("--iam-auth",      action = "store_true", help = "sign the requests with SigV4")
+    parser.add_argument("--parallelism",   default = "OVERSUBSCRIBE", choices = PARALLELISM,
+                        help = "OVERSUBSCRIBE uses every vCPU of the writer, the fastest option on an idle cluster")
+    parser.add_argument("--format",        default = "csv")
+    parser.add_argument("--fail-on-error", action = "store_true")
+    parser.add_argument("--update-single-cardinality", action = "store_true",
+                        help = "replace existing property values, for loading delta update files")
+    parser.add_argument("--poll-seconds",  type = float, default = 15)
+    parser.add_argument("--timeout",       type = float, default = None)
+    parser.add_argument("--no-wait",       action = "store_true", help = "only queue the loads")
+    options = parser.parse_args()
+
+    client   = LoaderClient(options.endpoint, options.iam_auth, options.region)
+    manifest = readManifest(options.manifest)
+    load_ids = submitLoads(client, manifest, options)
+    if options.no_wait:
+        print(json.dumps(load_ids, indent = 2))
+        sys.exit(0)
+
+    start    = time.time()
+    statuses = waitForLoads(client, load_ids, options.poll_seconds, options.timeout)
+    failed   = [name for name, payload in statuses.items()
+                if payload["overallStatus"]["status"] != "LOAD_COMPLETED"]
+    print(f"Loaded {len(statuses) - len(failed)} of {len(statuses)} labels in {time.time() - start:.0f}s")
+    if failed:
+        for name in failed:
+            print(f"{name}: {json.dumps(statuses[name].get('errors', {}))}")
+        sys.exit(1)
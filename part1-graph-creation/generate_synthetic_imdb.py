@@ -0,0 +1,139 @@
+"""
+Generates a synthetic stand-in for the licensed IMDb dump that process_imdb_data.py
+reads: title_essential, name_essential and the three boxoffice files, as gzipped
+JSONL with the same field layout, at any scale.
+
+The distributions are skewed the way the real catalog is: cast and keyword
+counts are heavy tailed, a few prolific people appear on a large share of the
+titles, and keyword and place popularity follow a power law.
+
+    python generate_synthetic_imdb.py --titles 100000 --output ./synthetic-raw
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+
+TITLE_TYPES  = [("movie", 0.30), ("tvEpisode", 0.40), ("tvSeries", 0.08), ("short", 0.12), ("video", 0.10)]
+GENRES       = ["Drama", "Comedy", "Action", "Thriller", "Romance", "Horror", "Crime", "Documentary",
+                "Adventure", "Family", "Animation", "Fantasy", "Sci-Fi", "Mystery", "Biography",
+                "History", "Music", "War", "Western", "Sport", "Musical", "Film-Noir"]
+KEYWORD_CATEGORIES = ["plot", "setting", "character", "genre", "theme", None]
+CAST_CATEGORIES    = ["actor", "actress", "self"]
+CREW_CATEGORIES    = ["director", "producer", "composer", "writer", "editor", "cinematographer",
+                      "production_designer", "casting_director", "stunts"]
+AWARDS   = [("Oscar", 0.15), ("Golden Globe", 0.25), ("BAFTA Film Award", 0.20), ("Cannes Film Festival", 0.15),
+            ("Sundance Film Festival", 0.25)]
+STATUSES = ["announced", "pre-production", "filming", "post-production", "completed", "released"]
+
+
+def skewed(rng, n, skew):
+    """
+    Index in [0, n) with a power-law bias towards 0: the larger skew, the more
+    the low indices (prolific people, common keywords) dominate.
+    """
+    return min(n - 1, int(n * rng.random() ** skew))
+
+def heavyTailed(rng, alpha, scale, cap):
+    return min(cap, int(scale * (rng.paretovariate(alpha) - 1)))
+
+def weighted(rng, choices):
+    return rng.choices([c for c, _ in choices], weights = [w for _, w in choices])[0]
+
+def quoted(rng, text):
+    # Some names carry double quotes, which the ETL has to escape
+    return f'{text} "{rng.randint(1, 9)}"' if rng.random() < 0.02 else text
+
+def awards(rng, ceremonies, year):
+    result = []
+    for i in range(heavyTailed(rng, 2.5, 1, 40) if rng.random() < 0.05 else 0):
+        name = weighted(rng, AWARDS)
+        result.append({"awardName"        : name,
+                       "awardNominationId": f"an{rng.randrange(10 ** 9):09d}",
+                       "event"            : f"{name} {ceremonies[skewed(rng, len(ceremonies), 1.5)]}",
+                       "winner"           : rng.random() < 0.3,
+                       "year"             : year + rng.randint(0, 2)})
+    return result
+
+def credits(rng, count, people, categories, skew):
+    return [{"nameId"  : f"nm{skewed(rng, people, skew):07d}",
+             "category": rng.choice(categories)} for _ in range(count)]
+
+def title(rng, index, options, ceremonies):
+    year = rng.randint(1900, 2023)
+    return {
+        "titleId"             : f"tt{index:08d}",
+        "titleType"           : weighted(rng, TITLE_TYPES),
+        "originalTitle"       : quoted(rng, f"Title {index}"),
+        "year"                : year,
+        "image"               : {"url": f"https://m.media-amazon.com/images/M/{index}.jpg"} if rng.random() < 0.7 else None,
+        "productionStatus"    : [{"status": s} for s in STATUSES[-rng.randint(1, 3):]],
+        "imdbRating"          : {"rating"       : round(rng.uniform(1, 10), 1),
+                                 "numberOfVotes": heavyTailed(rng, 1.2, 20, 3000000)} if rng.random() < 0.8 else None,
+        "genres"              : rng.sample(GENRES, rng.randint(1, 3)),
+        "keywordsV2"          : [{"keyword" : quoted(rng, f"keyword-{skewed(rng, options.keywords, 2.0)}"),
+                                  "category": rng.choice(KEYWORD_CATEGORIES)}
+                                 for _ in range(heavyTailed(rng, 1.3, 5, 500))],
+        "locations"           : [{"place": f"Place {skewed(rng, options.places, 2.5)}"}
+                                 for _ in range(heavyTailed(rng, 1.8, 1, 50))],
+        "principalCastMembers": credits(rng, 1 + heavyTailed(rng, 1.5, 4, 300), options.people, CAST_CATEGORIES, 2.0),
+        "principalCrewMembers": credits(rng, 1 + heavyTailed(rng, 1.5, 3, 200), options.people, CREW_CATEGORIES, 1.5),
+        "awards"              : awards(rng, ceremonies, year),
+    }
+
+def person(rng, index, ceremonies):
+    return {"nameId": f"nm{index:07d}",
+            "name"  : quoted(rng, f"Person {index}"),
+            "awards": awards(rng, ceremonies, rng.randint(1920, 2023)) or None}
+
+def boxoffice(rng, index):
+    titleId = f"tt{index:08d}"
+    gross   = heavyTailed(rng, 1.1, 100000, 3000000000)
+    return ([{"titleId": titleId, "weekendEndDate": "2000-01-01", "grossToDate": gross // 5}],
+            [{"titleId": titleId, "budgetItemType": rng.choice(["production", "marketing"]),
+              "amount": heavyTailed(rng, 1.2, 1000000, 400000000)}],
+            [{"titleId": titleId, "area": area, "grossToDate": gross // parts}
+             for area, parts in [("XWW", 1), ("XDOM", 2), ("XNDOM", 2)]])
+
+def writeJsonl(path, rows):
+    with gzip.open(path, "wt") as f:
+        for row in rows:
+            f.write(json.dumps(row))
+            f.write("\n")
+
+def generate(options):
+    os.makedirs(options.output, exist_ok = True)
+    ceremonies = [str(year) for year in range(1929, 2024)]
+
+    rng = random.Random(options.seed)
+    writeJsonl(f"{options.output}/title_essential_v1_complete.jsonl.gz",
+               (title(rng, i, options, ceremonies) for i in range(options.titles)))
+
+    rng = random.Random(options.seed + 1)
+    writeJsonl(f"{options.output}/name_essential_v1_complete.jsonl.gz",
+               (person(rng, i, ceremonies) for i in range(options.people)))
+
+    rng = random.Random(options.seed + 2)
+    sold = [boxoffice(rng, i) for i in range(options.titles) if rng.random() < options.boxoffice_fraction]
+    for position, name in enumerate(["boxoffice_title_opening_weekends_v1",
+                                     "boxoffice_title_budgets_v1",
+                                     "boxoffice_title_grosses_v1"]):
+        writeJsonl(f"{options.output}/{name}.jsonl.gz", (row for rows in sold for row in rows[position]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--titles",   type = int, default = 10000)
+    parser.add_argument("--people",   type = int, default = None, help = "defaults to 2 per title")
+    parser.add_argument("--keywords", type = int, default = None, help = "defaults to 1 per 5 titles")
+    parser.add_argument("--places",   type = int, default = None, help = "defaults to 1 per 20 titles")
+    parser.add_argument("--boxoffice-fraction", type = float, default = 0.1)
+    parser.add_argument("--seed",     type = int, default = 42)
+    parser.add_argument("--output",   default = "./synthetic-raw")
+    options = parser.parse_args()
+
+    options.people   = options.people   or 2 * options.titles
+    options.keywords = options.keywords or max(1, options.titles // 5)
+    options.places   = options.places   or max(1, options.titles // 20)
+    generate(options)
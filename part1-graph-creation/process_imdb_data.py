@@ -1,13 +1,42 @@
 import sys
-from awsglue.transforms import *
-from awsglue.utils import getResolvedOptions
+import time
+import json
+import argparse
+import threading
+import re
+import csv
+import urllib.request
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pyspark.context import SparkContext
-from awsglue.context import GlueContext
-from awsglue.job import Job
+from pyspark.conf import SparkConf
+from pyspark.sql import SparkSession
+try:
+    from awsglue.transforms import *
+    from awsglue.utils import getResolvedOptions
+    from awsglue.context import GlueContext
+    from awsglue.job import Job
+except ImportError:
+    # Plain PySpark (spark-submit, benchmark_etl.py) takes the same --<name> <value> job options
+    GlueContext = None
+
+    def getResolvedOptions(argv, options):
+        parser = argparse.ArgumentParser()
+        for option in options:
+            parser.add_argument(f"--{option}", required = True)
+        return vars(parser.parse_known_args(argv[1:])[0])
 from pyspark.sql.functions import explode, flatten, md5, crc32, format_string, regexp_replace
 from pyspark.sql.functions import concat, col, lit, isnan, when, count, udf,element_at
+from pyspark.sql.functions import struct, to_json, concat_ws, sort_array, collect_list
+from pyspark.sql.functions import coalesce, exists, row_number
+from pyspark.sql.functions import broadcast, rand, sequence, array
+from pyspark.sql.functions import posexplode, countDistinct, min as min_, max as max_
+from pyspark.sql.window    import Window
 from pyspark.sql.dataframe import DataFrame
 from pyspark.sql.types     import StringType, BooleanType, IntegerType
+from pyspark.sql.types     import StructType, StructField, ArrayType, LongType, DoubleType
+from pyspark.sql           import Observation
+from pyspark.storagelevel  import StorageLevel
 
 ## @params: [JOB_NAME]
 args = getResolvedOptions(sys.argv,
@@ -15,45 +44,615 @@ args = getResolvedOptions(sys.argv,
                            'output_bucket_path',
                            'raw_data_path'])
 
-sc = SparkContext()
+# FAIR scheduling lets the concurrently submitted dump* stages share the executors
+sc = SparkContext.getOrCreate(SparkConf().set("spark.scheduler.mode", "FAIR"))
 sc._jsc.hadoopConfiguration().set(
         "mapreduce.fileoutputcommitter.marksuccessfuljobs", "false")
-glueContext = GlueContext(sc)
-spark = glueContext.spark_session
-job = Job(glueContext)
-job.init(args['JOB_NAME'], args)
-job.commit()
+if GlueContext:
+    glueContext = GlueContext(sc)
+    spark = glueContext.spark_session
+    job = Job(glueContext)
+    job.init(args['JOB_NAME'], args)
+    job.commit()
+else:
+    spark = SparkSession(sc)
+
+def getOptionalArg(name, default):
+    # getResolvedOptions fails on options that were not passed to the job
+    if f"--{name}" in sys.argv:
+        return getResolvedOptions(sys.argv, [name])[name]
+    return default
 
 output_bucket_path = args['output_bucket_path']
 raw_data_path = args['raw_data_path']
 
-def filterMovies(titles, names, prefix = f"{output_bucket_path}/parquet"):
+# Pipeline mode: the filtered movie/people frames and the exploded cast/crew/awards
+# frames are persisted once and shared by every dump* stage, instead of re-scanning
+# the gzipped JSONL lineage for each count and write.
+cache_intermediates = getOptionalArg('cache_intermediates', 'true').lower() == 'true'
+storage_level       = getattr(StorageLevel, getOptionalArg('storage_level', 'MEMORY_AND_DISK'))
+
+# Output layout: independent dump* stages run as concurrent Spark jobs and each
+# label is written as several files of roughly target_file_mb, so that both the
+# write and the Neptune bulk loader can work on the files in parallel.
+stage_parallelism    = int(getOptionalArg('stage_parallelism', '4'))
+target_file_bytes    = int(getOptionalArg('target_file_mb', '128')) * 1024 * 1024
+max_records_per_file = int(getOptionalArg('max_records_per_file', '0'))
+compression          = getOptionalArg('compression', 'none')
+
+# Delta mode: every label also gets a content hash per ~id under
+# {output_bucket_path}/hashes. Given the previous run's output path, only the
+# rows added, updated or deleted since that run are written under
+# {output_bucket_path}/delta/<nodes|edges>/<label>/{add,update,delete}.
+delta_mode           = getOptionalArg('delta_mode', 'false').lower() == 'true'
+previous_output_path = getOptionalArg('previous_output_path', None)
+
+# Columnar staging: with stage_raw_data the raw JSONL dumps are converted once
+# into Parquet under staged_data_path. Every run given a staged_data_path then
+# reads the Parquet copy instead of decoding the gzipped JSONL.
+stage_raw_data   = getOptionalArg('stage_raw_data', 'false').lower() == 'true'
+staged_data_path = getOptionalArg('staged_data_path', f"{output_bucket_path}/staged" if stage_raw_data else None)
+
+# ID registry: genre, keyword, place and award event vertices get dense integer
+# ids kept across runs under id_registry_path, instead of colliding crc32 hashes.
+# A run into a new output path starts from the registry of previous_output_path,
+# so the ids of a delta are those of the graph it is applied to.
+id_registry_path = getOptionalArg('id_registry_path', f"{output_bucket_path}/ids")
+
+# People joins: nameId is heavily skewed, a few prolific people are credited on
+# thousands of titles. Key sets up to broadcast_key_limit keys are broadcast,
+# larger ones are joined with the hot keys (more than hot_key_rows rows) salted
+# over salt_buckets tasks. join_strategy forces either path.
+join_strategy       = getOptionalArg('join_strategy', 'auto')
+broadcast_key_limit = int(getOptionalArg('broadcast_key_limit', '5000000'))
+hot_key_rows        = int(getOptionalArg('hot_key_rows', '10000'))
+salt_buckets        = int(getOptionalArg('salt_buckets', '32'))
+
+# Dev graph: keeps only the movies whose crc32(titleId) falls in the first
+# sample_fraction of the hash range, the same ones on every run. Everything else
+# (people, genres, keywords, places, ratings, awards, box office) is derived from
+# the kept movies, so the sampled graph has no dangling edges.
+sample_fraction = float(getOptionalArg('sample_fraction', '1.0'))
+
+# Collaboration edges: person-person collaborated-with edges between everyone
+# credited on a same movie, weighted by the number of shared movies. Only the
+# first collaboration_max_people credits of a movie (cast before crew, in billing
+# order) are paired, so a movie contributes at most n*(n-1)/2 pairs.
+collaboration_edges      = getOptionalArg('collaboration_edges', 'false').lower() == 'true'
+collaboration_max_people = int(getOptionalArg('collaboration_max_people', '50'))
+
+# Telemetry: wall time, input/output rows, bytes and files written, and Spark's
+# shuffle and spill metrics per stage, written as a JSON report under report_path.
+report_path = getOptionalArg('report_path', f"{output_bucket_path}/reports")
+
+# Validation of the written CSVs before they are bulk loaded: typed headers,
+# values that do not parse as their declared type, missing ids and edges whose
+# ~from or ~to is not the ~id of any vertex. 'warn' writes the violations report,
+# 'fail' also fails the job before the load manifest is written, 'off' skips it.
+validation_mode   = getOptionalArg('validation_mode', 'warn')
+violation_samples = int(getOptionalArg('violation_samples', '20'))
+
+# Bulk load manifest: every label's files, rows and bytes, and the vertex labels
+# each edge label references, so bulk_load.py can queue vertices before edges.
+manifest_path = getOptionalArg('manifest_path', f"{output_bucket_path}/load-manifest.json")
+
+persisted = []
+
+stage_reports      = {}
+stage_reports_lock = threading.Lock()
+graph_outputs      = {}
+# Row counts of the frames shared between stages, by id(), taken once when built
+input_rows         = {}
+
+def persist(df):
+    if cache_intermediates:
+        df = df.persist(storage_level)
+        persisted.append(df)
+    return df
+
+def unpersistAll():
+    while persisted:
+        persisted.pop().unpersist()
+
+def observeCount(df):
+    """
+    Attaches a row count to df that is filled in by the next action on it,
+    so writing a frame also counts it without a second pass over the data.
+    """
+    observation = Observation()
+    return df.observe(observation, count(lit(1)).alias("rows")), observation
+
+# The rebalance hint lets adaptive execution split and merge the final shuffle
+# into partitions of about target_file_bytes each, based on the actual data size.
+spark.conf.set("spark.sql.adaptive.enabled", "true")
+spark.conf.set("spark.sql.adaptive.advisoryPartitionSizeInBytes", str(target_file_bytes))
+
+def writeCsv(df, path, **options):
+    df, observation = observeCount(df)
+    df.hint("rebalance").write.mode("overwrite")\
+      .option("maxRecordsPerFile", max_records_per_file)\
+      .csv(path, compression = compression, **options)
+    return recordOutput(path, observation.get["rows"])
+
+def writeParquet(df, path, *partitionBy):
+    df, observation = observeCount(df)
+    df.hint("rebalance").write.mode("overwrite").partitionBy(*partitionBy).parquet(path)
+    return recordOutput(path, observation.get["rows"])
+
+def hadoopPath(path):
+    jpath = sc._jvm.org.apache.hadoop.fs.Path(path)
+    return jpath.getFileSystem(sc._jsc.hadoopConfiguration()), jpath
+
+def pathExists(path):
+    fs, jpath = hadoopPath(path)
+    return fs.exists(jpath)
+
+def listFiles(path):
+    fs, jpath = hadoopPath(path)
+    return [{"path": str(status.getPath()), "bytes": status.getLen()}
+            for status in fs.listStatus(jpath)
+            if status.isFile() and status.getPath().getName().startswith("part-")]
+
+def writeText(path, text):
+    fs, jpath = hadoopPath(path)
+    stream = fs.create(jpath, True)
+    stream.write(bytearray(text.encode("utf-8")))
+    stream.close()
+
+def contentHash(df):
+    """
+    One hash per ~id over all of its rows, so labels where an ~id repeats with
+    different properties (e.g. a keyword in several categories) still diff cleanly.
+    """
+    rows = df.select("~id", md5(to_json(struct(*df.columns))).alias("~hash"))
+    return rows.groupBy("~id").agg(md5(concat_ws(",", sort_array(collect_list("~hash")))).alias("~hash"))
+
+def writeGraph(df, prefix, name, references = (), **options):
+    """
+    name       : <nodes|edges>/<label>
+    references : the node labels an edge label points to, which have to be
+                 loaded before it
+    """
+    if not delta_mode:
+        return recordGraph(prefix, name, references, writeCsv(df, f"{prefix}/{name}", **options))
+
+    df     = df.persist(storage_level)
+    rows   = writeCsv(df, f"{prefix}/{name}", **options)
+    hashes = contentHash(df).persist(storage_level)
+    # The previous hashes are diffed before the new ones are written, which
+    # replaces them when previous_output_path is this run's output path
+    if previous_output_path:
+        writeDelta(df, hashes, name, **options)
+    writeParquet(hashes, f"{output_bucket_path}/hashes/{name}")
+    hashes.unpersist()
+    df.unpersist()
+    return recordGraph(prefix, name, references, rows)
+
+def recordGraph(prefix, name, references, rows):
+    files = listFiles(f"{prefix}/{name}")
+    with stage_reports_lock:
+        graph_outputs[name] = {"name"      : name,
+                               "source"    : f"{prefix}/{name}/",
+                               "rows"      : rows,
+                               "bytes"     : sum(f["bytes"] for f in files),
+                               "files"     : files,
+                               "dependsOn" : [f"nodes/{label}" for label in references]}
+    return rows
+
+def writeDelta(df, hashes, name, **options):
+    """
+    add and update files have the same header as the full label and can be bulk
+    loaded as is, update with updateSingleCardinalityProperties. Edges whose ~id
+    changed endpoints have to be dropped and re-added instead. delete files only
+    carry the ~id of the vertices or edges to drop.
+    """
+    previous = f"{previous_output_path}/hashes/{name}"
+    if pathExists(previous):
+        previous = spark.read.parquet(previous)
+    else:
+        # The first delta run against an output without hashes adds everything
+        previous = hashes.limit(0)
+    previous = previous.withColumnRenamed("~hash", "~previous_hash")
+
+    changed = hashes.join(previous, "~id", how = "left")
+    add     = changed.filter(col("~previous_hash").isNull()).select("~id")
+    update  = changed.filter(col("~previous_hash") != col("~hash")).select("~id")
+    delete  = previous.join(hashes, "~id", how = "left_anti").select("~id")
+
+    for change, ids in [("add", add), ("update", update)]:
+        rows = df.join(ids, "~id", how = "left_semi")
+        print(f"Delta {name} {change}: {writeCsv(rows, f'{output_bucket_path}/delta/{name}/{change}', **options)}")
+    print(f"Delta {name} delete: {writeCsv(delete, f'{output_bucket_path}/delta/{name}/delete', header = True)}")
+
+def stageReport(name):
+    with stage_reports_lock:
+        return stage_reports.setdefault(name, {"stage": name, "outputs": []})
+
+def recordOutput(path, rows):
+    """
+    Adds a write to the report of the stage running it, and returns its row count
+    """
+    fs, jpath = hadoopPath(path)
+    summary   = fs.getContentSummary(jpath)
+    report    = stageReport(sc.getLocalProperty("spark.jobGroup.id") or "driver")
+    with stage_reports_lock:
+        report["outputs"].append({"path" : path,
+                                  "rows" : rows,
+                                  "bytes": summary.getLength(),
+                                  "files": summary.getFileCount()})
+    return rows
+
+def restApi(path):
+    with urllib.request.urlopen(f"{sc.uiWebUrl}/api/v1/applications/{sc.applicationId}/{path}") as response:
+        return json.load(response)
+
+def stageMetrics(group, timeout = 30):
+    """
+    Task metrics summed over the Spark stages of every job in group, from the
+    monitoring REST API. The status store is updated asynchronously, so this
+    first waits for the group's jobs to be marked finished.
+    """
+    if not sc.uiWebUrl:
+        return {}
+    deadline = time.time() + timeout
+    while True:
+        jobs = [job for job in restApi("jobs") if job.get("jobGroup") == group]
+        if all(job["status"] != "RUNNING" for job in jobs) or time.time() > deadline:
+            break
+        time.sleep(0.5)
+
+    names   = ["inputBytes", "outputBytes", "shuffleReadBytes", "shuffleWriteBytes",
+               "memoryBytesSpilled", "diskBytesSpilled"]
+    metrics = dict.fromkeys(names, 0)
+    metrics["peakJVMHeapBytes"] = 0
+    for stageId in {stageId for job in jobs for stageId in job["stageIds"]}:
+        for attempt in restApi(f"stages/{stageId}"):
+            for name in names:
+                metrics[name] += attempt.get(name, 0)
+            peak = (attempt.get("peakExecutorMetrics") or {}).get("JVMHeapMemory", 0)
+            metrics["peakJVMHeapBytes"] = max(metrics["peakJVMHeapBytes"], peak)
+    metrics["sparkJobs"] = len(jobs)
+    return metrics
+
+def runStage(name, stage, *dfs):
+    # Local properties are per thread, so every stage gets its own job group and pool
+    sc.setJobGroup(name, name)
+    sc.setLocalProperty("spark.scheduler.pool", name)
+    start   = time.time()
+    result  = stage(*dfs)
+    elapsed = time.time() - start
+
+    report = stageReport(name)
+    report["wallSeconds"] = round(elapsed, 3)
+    report.update(stageMetrics(name))
+    report["inputRows"] = [input_rows.get(id(df)) for df in dfs]
+    print(f"Stage {name} finished in {elapsed:.1f}s")
+    return result
+
+def runStages(stages):
+    """
+    stages : [(name, dump*, *dataframes), ...] that do not depend on each other
+    """
+    with ThreadPoolExecutor(max_workers = stage_parallelism) as pool:
+        futures = [pool.submit(runStage, *stage) for stage in stages]
+        for future in as_completed(futures):
+            future.result()
+
+
+def writeReport(wall_seconds):
+    finished = datetime.now(timezone.utc)
+    report   = {"jobName"      : args['JOB_NAME'],
+                "applicationId": sc.applicationId,
+                "finishedAt"   : finished.isoformat(),
+                "wallSeconds"  : round(wall_seconds, 3),
+                "options"      : {name: str(globals()[name]) for name in report_options},
+                "stages"       : list(stage_reports.values())}
+    path = f"{report_path}/etl-report-{finished.strftime('%Y%m%dT%H%M%SZ')}.json"
+    writeText(path, json.dumps(report, indent = 2))
+    print(f"Report written to {path}")
+
+report_options = ["raw_data_path", "output_bucket_path", "cache_intermediates", "storage_level",
+                  "stage_parallelism", "target_file_bytes", "max_records_per_file", "compression",
+                  "delta_mode", "previous_output_path", "stage_raw_data", "staged_data_path",
+                  "id_registry_path", "join_strategy", "broadcast_key_limit", "hot_key_rows", "salt_buckets",
+                  "validation_mode", "violation_samples", "sample_fraction",
+                  "collaboration_edges", "collaboration_max_people"]
+
+
+# Property types of the Neptune bulk load CSV format, and what they are checked as
+neptune_types = {"Bool": "boolean", "Boolean": "boolean", "Byte": "tinyint", "Short": "smallint",
+                 "Int": "int", "Long": "bigint", "Float": "float", "Double": "double",
+                 "Date": "date", "String": "string"}
+system_columns = {"nodes": ["~id"], "edges": ["~id", "~from", "~to", "~label"]}
+typed_header   = re.compile(r"^[^:~]+:(\w+)(\[\])?(\((single|set)\))?$")
+
+def checkHeader(kind, columns):
+    violations = [f"missing {column}" for column in system_columns[kind] if column not in columns]
+    for column in columns:
+        if column.startswith("~"):
+            if column not in ["~id", "~label", "~from", "~to"]:
+                violations.append(f"unknown system column {column}")
+            continue
+        match = typed_header.match(column)
+        if not match or match.group(1) not in neptune_types:
+            violations.append(f"untyped or unknown type {column}")
+    return violations
+
+def checkValues(df):
+    """
+    One pass over a label: missing ids, and values that do not cast to the
+    type their header declares (e.g. gross_worldwide:Int past 2^31).
+    """
+    checks = [count(when(col(f"`{column}`").isNull(), 1)).alias(f"null {column}")
+              for column in df.columns if column in ["~id", "~from", "~to"]]
+    for column in df.columns:
+        match = typed_header.match(column)
+        if match and neptune_types.get(match.group(1), "string") != "string" and not match.group(2):
+            value = col(f"`{column}`")
+            checks.append(count(when(value.isNotNull() & value.cast(neptune_types[match.group(1)]).isNull(), 1))
+                          .alias(f"invalid {column}"))
+    if not checks:
+        return {}
+    return {name: bad for name, bad in df.select(*checks).first().asDict().items() if bad}
+
+def readHeader(path):
+    fs, jpath = hadoopPath(path)
+    stream = fs.open(jpath)
+    # Decompresses .csv.gz (and any other codec Hadoop knows by extension)
+    codec  = sc._jvm.org.apache.hadoop.io.compress.CompressionCodecFactory(sc._jsc.hadoopConfiguration())\
+                        .getCodec(jpath)
+    if codec is not None:
+        stream = codec.createInputStream(stream)
+    line   = sc._jvm.java.io.BufferedReader(sc._jvm.java.io.InputStreamReader(stream, "UTF-8")).readLine()
+    stream.close()
+    return next(csv.reader([line or ""]))
+
+def checkLabel(name, group):
+    # Job groups are per thread, keep the label checks in the validate stage's group
+    sc.setJobGroup(group, group)
+    load = graph_outputs[name]
+    # Reading the header off the first file spares Spark a job per label to infer it
+    header = readHeader(load["files"][0]["path"]) if load["files"] else ["~id"]
+    df = spark.read.schema(StructType([StructField(column, StringType()) for column in header]))\
+                   .csv(load["source"], header = True, enforceSchema = True)
+    violations = {"header": checkHeader(name.split("/")[0], df.columns), **checkValues(df)}
+    return name, df, {key: value for key, value in violations.items() if value}
+
+def validateGraph():
+    group = sc.getLocalProperty("spark.jobGroup.id")
+    with ThreadPoolExecutor(max_workers = stage_parallelism) as pool:
+        checked = list(pool.map(lambda name: checkLabel(name, group), sorted(graph_outputs)))
+    labels = {name: df for name, df, _ in checked}
+    report = {name: violations for name, _, violations in checked}
+
+    # Every edge endpoint of every label goes through a single anti-join
+    # against all vertex ids, broadcast when the vertex set is small enough
+    vertices = persist(unionAll([df.select("~id") for name, df in labels.items() if name.startswith("nodes/")])
+                       .distinct())
+    endpoints = unionAll([df.select(lit(name).alias("label"), lit(endpoint).alias("endpoint"),
+                                    col(endpoint).alias("~id"), col("~id").alias("edge"))
+                          for name, df in labels.items() if name.startswith("edges/")
+                          for endpoint in ["~from", "~to"] if endpoint in df.columns])
+    orphans = semiJoin(endpoints.filter(col("~id").isNotNull()), vertices, "~id", how = "left_anti")
+    orphans = orphans.withColumn("n", row_number().over(Window.partitionBy("label", "endpoint").orderBy("edge")))
+    orphans = orphans.withColumn("total", count(lit(1)).over(Window.partitionBy("label", "endpoint")))
+    for row in orphans.filter(col("n") <= violation_samples).collect():
+        orphan = report[row["label"]].setdefault(f"orphan {row['endpoint']}", {"count": row["total"], "samples": []})
+        orphan["samples"].append({"edge": row["edge"], "missing": row["~id"]})
+
+    violations = {name: checks for name, checks in report.items() if checks}
+    path = f"{report_path}/validation-report-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.json"
+    writeText(path, json.dumps({"labels": len(labels), "violations": violations}, indent = 2))
+    print(f"Validation: {len(violations)} of {len(labels)} labels with violations, report written to {path}")
+    if violations and validation_mode == "fail":
+        raise ValueError(f"Graph validation failed for {sorted(violations)}, see {path}")
+
+def unionAll(dfs):
+    result = dfs[0]
+    for df in dfs[1:]:
+        result = result.unionByName(df)
+    return result
+
+def writeManifest():
+    """
+    Orders the labels for the bulk loader: all node labels first, largest
+    first, then the edge labels, each depending on the node labels it references.
+    """
+    loads = sorted(graph_outputs.values(),
+                   key = lambda load: (load["name"].startswith("edges/"), -load["bytes"], load["name"]))
+    for load in loads:
+        missing = [name for name in load["dependsOn"] if name not in graph_outputs]
+        if missing:
+            raise ValueError(f"{load['name']} references labels that were not written: {missing}")
+    manifest = {"format"     : "csv",
+                "generatedAt": datetime.now(timezone.utc).isoformat(),
+                "rows"       : sum(load["rows"] for load in loads),
+                "bytes"      : sum(load["bytes"] for load in loads),
+                "loads"      : loads}
+    writeText(manifest_path, json.dumps(manifest, indent = 2))
+    print(f"Load manifest written to {manifest_path}")
+
+
+def structOf(**fields):
+    return StructType([StructField(name, dataType) for name, dataType in fields.items()])
+
+credits_schema = ArrayType(structOf(nameId = StringType(), category = StringType()))
+awards_schema  = ArrayType(structOf(awardName         = StringType(),
+                                    awardNominationId = StringType(),
+                                    event             = StringType(),
+                                    winner            = BooleanType(),
+                                    year              = LongType()))
+
+# Only the fields the dump* stages use, so the JSON reader neither infers a
+# schema nor materializes the rest of each record.
+raw_schemas = {
+    "title_essential_v1_complete": structOf(
+        titleId              = StringType(),
+        titleType            = StringType(),
+        originalTitle        = StringType(),
+        year                 = LongType(),
+        image                = structOf(url = StringType()),
+        productionStatus     = ArrayType(structOf(status = StringType())),
+        imdbRating           = structOf(rating = DoubleType(), numberOfVotes = LongType()),
+        genres               = ArrayType(StringType()),
+        keywordsV2           = ArrayType(structOf(category = StringType(), keyword = StringType())),
+        locations            = ArrayType(structOf(place = StringType())),
+        principalCastMembers = credits_schema,
+        principalCrewMembers = credits_schema,
+        awards               = awards_schema),
+    "name_essential_v1_complete": structOf(
+        nameId = StringType(),
+        name   = StringType(),
+        awards = awards_schema),
+    "boxoffice_title_opening_weekends_v1": structOf(
+        titleId = StringType()),
+    "boxoffice_title_budgets_v1": structOf(
+        titleId        = StringType(),
+        budgetItemType = StringType(),
+        amount         = DoubleType()),
+    "boxoffice_title_grosses_v1": structOf(
+        titleId     = StringType(),
+        area        = StringType(),
+        grossToDate = DoubleType()),
+}
+
+def readRaw(name):
+    if staged_data_path:
+        return spark.read.parquet(f"{staged_data_path}/{name}")
+    return spark.read.schema(raw_schemas[name]).json(f"{raw_data_path}/{name}.jsonl.gz")
+
+def stageRawData():
+    """
+    Titles are partitioned by titleType, so filtering on movies only reads that partition
+    """
+    for name, schema in raw_schemas.items():
+        df = spark.read.schema(schema).json(f"{raw_data_path}/{name}.jsonl.gz")
+        partitionBy = ["titleType"] if "titleType" in df.columns else []
+        print(f"Staged {name}: {writeParquet(df, f'{staged_data_path}/{name}', *partitionBy)}")
 
-    mdf      = titles.filter(titles.titleType == 'movie')
 
-    mdf.coalesce(1).write.mode("overwrite").parquet(f"{prefix}/movies.parquet")
+def registerIds(entity, keys):
+    """
+    Returns the (key, id) registry of entity after adding the distinct values of
+    the single column of keys. Registered keys keep their id; new keys are
+    numbered after the largest id, in key order. The registry is written back
+    sorted by id to {id_registry_path}/<entity>, where downstream jobs can use
+    it as a lookup or as embedding row indices. Without a registry there, it
+    starts from the one of previous_output_path.
+    """
+    path  = f"{id_registry_path}/{entity}"
+    seed  = f"{previous_output_path}/ids/{entity}" if previous_output_path else None
+    keys  = keys.select(col(keys.columns[0]).alias("key")).filter(col("key").isNotNull()).distinct()
+    if pathExists(path):
+        known = spark.read.parquet(path)
+    elif seed and pathExists(seed):
+        known = spark.read.parquet(seed)
+    else:
+        known = keys.select("key", lit(None).cast("long").alias("id")).limit(0)
+    last  = known.selectExpr("max(id)").first()[0]
+    last  = -1 if last is None else last
+    # zipWithIndex numbers the sorted keys partition by partition, where a
+    # global row_number() window would pull every new key into one task
+    added = keys.join(known, "key", how = "left_anti").orderBy("key").rdd\
+                .zipWithIndex().map(lambda row: (row[0]["key"], last + 1 + row[1]))\
+                .toDF(known.schema)
+
+    # The old registry stays in place until the new one is completely written
+    fs, jpath = hadoopPath(path)
+    written   = sc._jvm.org.apache.hadoop.fs.Path(f"{path}.tmp")
+    previous  = sc._jvm.org.apache.hadoop.fs.Path(f"{path}.previous")
+    known.union(added).orderBy("id").write.mode("overwrite").parquet(f"{path}.tmp")
+    fs.delete(previous, True)
+    if fs.exists(jpath):
+        fs.rename(jpath, previous)
+    fs.rename(written, jpath)
+    fs.delete(previous, True)
+
+    registry = spark.read.parquet(path)
+    print(f"Registered {entity} ids: {registry.count()}")
+    return registry
+
+def denseIds(df, entity, key):
+    """
+    Appends the registered id of df[key] to df as column "id"
+    """
+    ids = registerIds(entity, df.select(key)).withColumnRenamed("key", key)
+    return df.join(ids, key, how = "left")
+
 
-    cast    = mdf.select(explode("principalCastMembers").alias("cast")).select("cast.nameId")
-    crew    = mdf.select(explode("principalCrewMembers").alias("crew")).select("crew.nameId")
-    credits = cast.join(crew, "nameId", how = "outer").distinct()
+def saltedSemiJoin(df, keys, key, how = "left_semi"):
+    """
+    Rows of df whose key is (left_anti: is not) in keys, with each hot key of
+    df spread over salt_buckets random salts and keys replicated once per salt.
+    """
+    hot  = df.groupBy(key).count().filter(col("count") > hot_key_rows).select(key, lit(True).alias("hot"))
+    hot  = broadcast(hot)
+    df   = df.join(hot, key, how = "left")\
+             .withColumn("salt", when(col("hot"), (rand() * salt_buckets).cast("int")).otherwise(0))
+    keys = keys.join(hot, key, how = "left")\
+               .withColumn("salt", explode(when(col("hot"), sequence(lit(0), lit(salt_buckets - 1))).otherwise(array(lit(0)))))
+    return df.join(keys.select(key, "salt"), [key, "salt"], how = how).drop("hot", "salt")
+
+def semiJoin(df, keys, key, how = "left_semi"):
+    """
+    Rows of df whose key is (left_anti: is not) in the distinct keys frame,
+    without shuffling df by its skewed key when the key set is small enough
+    to broadcast.
+    """
+    strategy = join_strategy
+    if strategy == "auto":
+        strategy = "broadcast" if keys.count() <= broadcast_key_limit else "salted"
+    if strategy == "broadcast":
+        return df.join(broadcast(keys), key, how = how)
+    return saltedSemiJoin(df, keys, key, how)
 
-    pdf      = names.join(credits, "nameId", how = "inner")
 
-    pdf.coalesce(1).write.mode("overwrite").parquet(f"{prefix}/people.parquet")
+def explodeCredits(tf):
+    cast = tf.select('titleId', posexplode('principalCastMembers').alias('position', 'cast')).select('titleId','cast.nameId', 'cast.category', 'position')
+    crew = tf.select('titleId', posexplode('principalCrewMembers').alias('position', 'crew')).select('titleId','crew.nameId', 'crew.category', 'position')
+    return persist(cast), persist(crew)
 
-    print(f"# of Movie Titles : {mdf.count():>7}")
-    print(f"# of Movie People : {pdf.count():>7}")
-    return mdf,pdf
+# Built-in column expressions instead of Python UDFs, so these stay inside
+# Catalyst/codegen rather than shipping every row to a Python worker.
 
+def fix(column):
+    # str(None) used to turn missing values into "None", keep the output identical
+    return regexp_replace(coalesce(col(column), lit("None")), '"', "''")
 
-def dumpMovie(tf, prefix = f"{output_bucket_path}/graph"):
-    @udf
-    def fix(string):
-        return str(string).replace('"', "''") 
+def oscarNominee(column):
+    return coalesce(exists(column, lambda a: a.awardName == "Oscar"), lit(False))
 
-    opening_df = spark.read.json(f'{raw_data_path}/boxoffice_title_opening_weekends_v1.jsonl.gz')
-    budgets_df = spark.read.json(f'{raw_data_path}/boxoffice_title_budgets_v1.jsonl.gz')
-    grosses_df = spark.read.json(f'{raw_data_path}/boxoffice_title_grosses_v1.jsonl.gz')
+def oscarWinner(column):
+    return coalesce(exists(column, lambda a: (a.awardName == "Oscar") & a.winner.cast("boolean")), lit(False))
+
+def filterMovies(titles, names, prefix = f"{output_bucket_path}/parquet"):
+
+    movies   = titles.filter(titles.titleType == 'movie')
+    if sample_fraction < 1.0:
+        movies = movies.filter(crc32(col("titleId")) < lit(int(sample_fraction * 2 ** 32)))
+    mdf      = persist(movies)
+
+    input_rows[id(mdf)] = writeParquet(mdf, f'{prefix}/movies.parquet')
+    print(f"# of Movie Titles : {input_rows[id(mdf)]:>7}")
+
+    cast, crew = explodeCredits(mdf)
+    credits = persist(cast.select("nameId").union(crew.select("nameId")).distinct())
+
+    pdf      = persist(semiJoin(names, credits, "nameId"))
+
+    input_rows[id(pdf)] = writeParquet(pdf, f'{prefix}/people.parquet')
+    print(f"# of Movie People : {input_rows[id(pdf)]:>7}")
+    # Building pdf filled the credit caches, so these only scan the cache
+    if cache_intermediates:
+        input_rows[id(cast)] = cast.count()
+        input_rows[id(crew)] = crew.count()
+    return mdf,pdf,cast,crew
+
+
+def dumpMovie(tf, prefix = f"{output_bucket_path}/graph"):
+    opening_df = readRaw('boxoffice_title_opening_weekends_v1')
+    budgets_df = readRaw('boxoffice_title_budgets_v1')
+    grosses_df = readRaw('boxoffice_title_grosses_v1')
 
     grosses_in = grosses_df.filter(col("area") == "XNDOM").select("titleId", col("grossToDate").alias("grossInternational").cast("long"))
     grosses_ww = grosses_df.filter(col("area") == "XWW"  ).select("titleId", col("grossToDate").alias("grossWorldwide").cast("int"))
@@ -104,17 +703,16 @@ def dumpMovie(tf, prefix = f"{output_bucket_path}/graph"):
         col("grossDomestic"     ).alias("gross_domestic:Int"),
         col("budgetProduction"  ).alias("budget_production:Int")).distinct().na.fill(na)
 
-    print("node count is", nodes.count())
-
-    nodes.coalesce(1).write.mode("overwrite").csv(f"{prefix}/nodes/movie", header = True)
+    print("node count is", writeGraph(nodes, prefix, "nodes/movie", header = True))
 
     #assert nodes.count() == 602895
 
 
 def dumpGenre(tf, prefix = f"{output_bucket_path}/graph"):
     gf = tf.select(tf.titleId, explode(tf.genres).alias("genre"))
+    gf = denseIds(gf, "genre", "genre")
     gf = gf.select(col("titleId"),
-                   format_string("gn%010d", crc32("genre")).alias("genreId"),
+                   format_string("gn%010d", "id").alias("genreId"),
                    col("genre"))
     """
     edges : ~id, ~from, ~to, ~label, <property>:<type>, ...
@@ -132,11 +730,8 @@ def dumpGenre(tf, prefix = f"{output_bucket_path}/graph"):
         lit("genre").alias("~label"),
         col("genre").alias("name:String")).distinct()
 
-    print("edge count is", edges.count())
-    print("node count is", nodes.count())
-
-    edges.coalesce(1).write.mode("overwrite").csv(f"{prefix}/edges/movie-genre", header = True)
-    nodes.coalesce(1).write.mode("overwrite").csv(f"{prefix}/nodes/genre", header = True)
+    print("edge count is", writeGraph(edges, prefix, "edges/movie-genre", references = ["movie", "genre"], header = True))
+    print("node count is", writeGraph(nodes, prefix, "nodes/genre", header = True))
 
 def dumpKeyword(tf, prefix = f"{output_bucket_path}/graph"):
     kf = tf.select("titleId", explode("keywordsV2").alias("v2"))
@@ -144,9 +739,10 @@ def dumpKeyword(tf, prefix = f"{output_bucket_path}/graph"):
                    col("v2.category").alias("category"),
                    col("v2.keyword").alias("keyword"))
     kf = kf.na.fill("other", subset=["category"])
+    kf = denseIds(kf, "keyword", "keyword")
     kf = kf.select(
         "titleId",
-        format_string("kn%010d", crc32("keyword")).alias("keywordId"),
+        format_string("kn%010d", "id").alias("keywordId"),
         "keyword",
         "category")
     """
@@ -166,59 +762,74 @@ def dumpKeyword(tf, prefix = f"{output_bucket_path}/graph"):
         regexp_replace("keyword", '["]', "").alias("name:String"),
         col("category").alias("keyword_type:String")).distinct()
 
-    print("edge count is", edges.count())
-    print("node count is", nodes.count())
+    print("edge count is", writeGraph(edges, prefix, "edges/movie-keyword", references = ["movie", "keyword"], header = True))
+    print("node count is", writeGraph(nodes, prefix, "nodes/keyword", header = True))
 
-    edges.coalesce(1).write.mode("overwrite").csv(f"{prefix}/edges/movie-keyword", header = True)
-    nodes.coalesce(1).write.mode("overwrite").csv(f"{prefix}/nodes/keyword", header = True)
-
-def dumpContributor(tf,ndf, prefix = f"{output_bucket_path}/graph"):
+def contributorCredits(cast, crew, ndf):
     ndf = ndf.select("nameId")
     
     cats = ['director', 'producer', 'composer', 'writer', 'editor', 'cinematographer', 'production_designer']
 
-    cast = tf.select('titleId', explode('principalCastMembers').alias('cast')).select('titleId','cast.nameId', 'cast.category')
-    crew = tf.select('titleId', explode('principalCrewMembers').alias('crew')).select('titleId','crew.nameId', 'crew.category').where(col('category').isin(cats))
-    
-    cast = cast.join(ndf,"nameId", how = "inner")
-    crew = crew.join(ndf,"nameId", how = "inner")
+    crew = crew.where(col('category').isin(cats))
+
+    # One join and one distinct over cast and crew together
+    credits = cast.withColumn("credit", lit("cast")).union(crew.withColumn("credit", lit("crew")))
+    return semiJoin(credits, ndf, "nameId")
+
+def dumpContributor(cast, crew, ndf, prefix = f"{output_bucket_path}/graph"):
+    credits = contributorCredits(cast, crew, ndf)
 
     """
     edges : ~id, ~from, ~to, ~label, <property>:<type>, ...
     """
 
-    edges = cast.select(
-        format_string("%s-cast-%s", "titleId", "nameId").alias("~id"),
+    edges = credits.select(
+        format_string("%s-%s-%s", "titleId", "credit", "nameId").alias("~id"),
         col("titleId").alias("~from"),
         col("nameId").alias("~to"),
-        format_string("casted-by-%s", "category").alias("~label"))
+        format_string("%s-by-%s", when(col("credit") == "cast", "casted").otherwise("crewed"), "category").alias("~label")).distinct()
 
-    edges = edges.union(crew.select(
-        format_string("%s-crew-%s", "titleId", "nameId").alias("~id"),
-        col("titleId").alias("~from"),
-        col("nameId").alias("~to"),
-        format_string("crewed-by-%s", "category").alias("~label"))).distinct()
-
-    edges.coalesce(1).write.mode("overwrite").csv(f"{prefix}/edges/person-title", header = True)
+    edge_count = writeGraph(edges, prefix, "edges/person-title", references = ["movie", "person"], header = True)
 
     #edges.show()
 
-    print("edge count is", edges.count())
+    print("edge count is", edge_count)
+
+def dumpCollaboration(cast, crew, ndf, tdf, prefix = f"{output_bucket_path}/graph"):
+    credits = contributorCredits(cast, crew, ndf)
+
+    # Top billed first; someone credited twice on a movie keeps their first credit
+    credits = credits.groupBy("titleId", "nameId")\
+                     .agg(min_(struct(when(col("credit") == "cast", 0).otherwise(1).alias("crew"), "position")).alias("billing"))
+    billing = Window.partitionBy("titleId").orderBy("billing", "nameId")
+    credits = credits.withColumn("rank", row_number().over(billing))\
+                     .filter(col("rank") <= collaboration_max_people)\
+                     .join(tdf.select("titleId", "year"), "titleId")\
+                     .select("titleId", "nameId", "year")
+
+    a, b  = credits.alias("a"), credits.alias("b")
+    pairs = a.join(b, (col("a.titleId") == col("b.titleId")) & (col("a.nameId") < col("b.nameId")))\
+             .select(col("a.nameId").alias("from"), col("b.nameId").alias("to"), col("a.titleId"), col("a.year"))
+
+    """
+    edges : ~id, ~from, ~to, ~label, <property>:<type>, ...
+    """
+    edges = pairs.groupBy("from", "to").agg(countDistinct("titleId").alias("titles"),
+                                            min_("year").alias("first_year"),
+                                            max_("year").alias("last_year"))\
+                 .select(format_string("%s-collab-%s", "from", "to").alias("~id"),
+                         col("from").alias("~from"),
+                         col("to").alias("~to"),
+                         lit("collaborated-with").alias("~label"),
+                         col("titles").alias("titles:Int"),
+                         col("first_year").alias("first_year:Int"),
+                         col("last_year").alias("last_year:Int"))\
+                 .na.fill(-1)
+
+    print("edge count is", writeGraph(edges, prefix, "edges/collaborated-with", references = ["person"], header = True))
 
 def dumpPerson(ndf, tdf, prefix = f"{output_bucket_path}/graph"):
     # Node
-    @udf(returnType=BooleanType())
-    def oscarNominee(awards):
-        return any(a.awardName == "Oscar" for a in awards or [])
-
-    @udf(returnType=BooleanType())
-    def oscarWinner(awards):
-        return any(a.awardName == "Oscar" and a.winner for a in awards or [])
-        
-    @udf
-    def fix(string):
-        return str(string).replace('"', "''") 
-        
     pf = ndf.select(col("nameId"),
                    fix("name").alias("name"),
                    oscarNominee("awards").alias("oscarNominee"),
@@ -237,9 +848,7 @@ def dumpPerson(ndf, tdf, prefix = f"{output_bucket_path}/graph"):
     nodes.printSchema()
   # nodes.show()
 
-    print("node count is", nodes.count())
-
-    nodes.coalesce(1).write.mode("overwrite").csv(f"{prefix}/nodes/person", header = True, quoteAll = True)
+    print("node count is", writeGraph(nodes, prefix, "nodes/person", header = True, quoteAll = True))
 
 
 def dumpRating(tdf, prefix = f"{output_bucket_path}/graph"):
@@ -250,8 +859,7 @@ def dumpRating(tdf, prefix = f"{output_bucket_path}/graph"):
             .na.drop()
     r = rate.select('~id','~label','rating:Float')
     #r.show(5)
-    print(f"Node: IMDB Rating: {rate.count()}")
-    r.coalesce(1).write.csv(f"{prefix}/nodes/rating/",header=True)
+    print(f"Node: IMDB Rating: {writeGraph(r, prefix, 'nodes/rating', header=True)}")
     n = tdf.select('titleId','imdbRating.rating').dropDuplicates()
     n1 = n.withColumn("~id",concat(lit("eTTRt-"),(col("rating")*10).cast('int'),lit("-"),col('titleId')))\
           .withColumnRenamed("titleId","~from")\
@@ -259,55 +867,50 @@ def dumpRating(tdf, prefix = f"{output_bucket_path}/graph"):
           .withColumn("~label",lit("has_rating"))
     n1=n1.na.drop(how='any')
     #n1.show(5)
-    print(f"Edge: IMDB Rating: {n1.count()}")
     n1 = n1.select('~id','~from','~to','~label')
-    n1.coalesce(1).write.csv(f"{prefix}/edges/has_rating/",header=True)
+    print(f"Edge: IMDB Rating: {writeGraph(n1, prefix, 'edges/has_rating', references=['movie', 'rating'], header=True)}")
 
 def dumpAwards(ndf,tdf,prefix = f"{output_bucket_path}/graph"):
     # Node
-    awards_title = tdf.select("titleId",explode("awards").alias("awards")).select('titleId','awards.*')
-    awards_name = ndf.select("nameId",explode("awards").alias("awards")).select('nameId','awards.*')
+    awards_title = persist(tdf.select("titleId",explode("awards").alias("awards")).select('titleId','awards.*'))
+    awards_name = persist(ndf.select("nameId",explode("awards").alias("awards")).select('nameId','awards.*'))
     awards = awards_title.select('event').union(awards_name.select('event'))
-    awards_event = awards.select("event")\
-                        .withColumn("~id",crc32(col("event")))\
+    events = registerIds("award_event", awards).withColumnRenamed("key", "event")
+    awards_event = awards.join(events, "event")\
+                        .withColumn("~id",format_string("ev%010d", "id"))\
                         .withColumn("~label",lit("award_event"))\
                         .withColumn("event",regexp_replace(col("event"),'"',"'"))\
                         .withColumnRenamed("event","event:String")\
                         .dropDuplicates()
     ae = awards_event.select("~id","~label","event:String")
-    print(f"Node: Award: {ae.count()}")
+    print(f"Node: Award: {writeGraph(ae, prefix, 'nodes/award_event', header=True)}")
     #ae.show(5,False)
-    ae.coalesce(1).write.csv(f"{prefix}/nodes/award_event/",header=True)
     # Edges: winner, nominations
-    at = awards_title.select(concat(col("awardNominationId"),lit("-"),col("titleId"),lit("-"),col("year")).alias("~id"),col("titleId").alias("~from"),"event","winner","year")\
-        .withColumn("event",crc32(col("event")))\
+    at = awards_title.join(events, "event", how = "left")\
+        .select(concat(col("awardNominationId"),lit("-"),col("titleId"),lit("-"),col("year")).alias("~id"),col("titleId").alias("~from"),"event","winner","year","id")\
+        .withColumn("event",format_string("ev%010d", "id"))\
         .withColumnRenamed("event","~to")\
         .withColumnRenamed("year","year:Int")\
         .withColumn("~label",lit("nominated_for")).distinct()
     at_nom = at.filter("winner == 0")
     at_won = at.filter("winner == 1")
     at_nom = at_nom.select("~id","~from","~to","~label","year:Int")
-    print(f"Edge: Award nominated: {at_nom.count()}")
+    print(f"Edge: Award nominated: {writeGraph(at_nom, prefix, 'edges/has_nomination', references=['movie', 'award_event'], header=True)}")
     #at_nom.show(5,False)
-    at_nom.coalesce(1).write.csv(f"{prefix}/edges/has_nomination/",header=True)
     at_won= at_won.withColumn("~id",concat(lit("aw"),col("~id")))\
                   .withColumn("~label",lit("has_won"))
     at_won = at_won.select("~id","~from","~to","~label","year:Int")
-    print(f"Edge: Award won: {at_won.count()}")
+    print(f"Edge: Award won: {writeGraph(at_won, prefix, 'edges/has_won', references=['movie', 'award_event'], header=True)}")
     #at_won.show(5,False)
-    at_won.coalesce(1).write.csv(f"{prefix}/edges/has_won/",header=True)
     
 def dumpPlace(tf, prefix=f"{output_bucket_path}/graph"):
 
     from pyspark.sql.functions import explode, flatten, udf, crc32, format_string, regexp_replace, concat, col, lit, isnan, when, count
 
-    @udf
-    def fix(string):
-        return str(string).replace('"', "''")
-    
     lf = tf.select("titleId", explode("locations").alias("location"))
     lf = lf.select("titleId", col("location.place").alias("place"))
-    lf = lf.select("titleId", format_string("pl%010d", crc32("place")).alias("placeId"), col("place"))
+    lf = denseIds(lf, "place", "place")
+    lf = lf.select("titleId", format_string("pl%010d", "id").alias("placeId"), col("place"))
 
     """
     edges : ~id, ~from, ~to, ~label, <property>:<type>, ...
@@ -325,22 +928,36 @@ def dumpPlace(tf, prefix=f"{output_bucket_path}/graph"):
         lit("place").alias("~label"),
         fix("place").alias("name:String")).distinct()
 
-    print("edge count is", edges.count())
-    print("node count is", nodes.count())
-
-    edges.coalesce(1).write.mode("overwrite").csv(f"{prefix}/edges/movie-place", header = True, quoteAll = True)
-    nodes.coalesce(1).write.mode("overwrite").csv(f"{prefix}/nodes/place",       header = True, quoteAll = True)
-
-
-title_df= spark.read.json(f"{raw_data_path}/title_essential_v1_complete.jsonl.gz")
-name_df = spark.read.json(f"{raw_data_path}/name_essential_v1_complete.jsonl.gz")
-
-movie_df, people_df = filterMovies(title_df,name_df)
-dumpMovie(movie_df)
-dumpGenre(movie_df)
-dumpKeyword(movie_df)
-dumpContributor(movie_df,people_df)
-dumpPerson(people_df,movie_df)
-dumpRating(movie_df)
-dumpAwards(people_df,movie_df)
-dumpPlace(movie_df)
+    print("edge count is", writeGraph(edges, prefix, "edges/movie-place", references = ["movie", "place"], header = True, quoteAll = True))
+    print("node count is", writeGraph(nodes, prefix, "nodes/place",       header = True, quoteAll = True))
+
+
+def main():
+    start = time.time()
+    if stage_raw_data:
+        runStage("stage", stageRawData)
+
+    title_df= readRaw("title_essential_v1_complete")
+    name_df = readRaw("name_essential_v1_complete")
+
+    movie_df, people_df, cast_df, crew_df = runStage("filter", filterMovies, title_df, name_df)
+    stages = [("movie",       dumpMovie,       movie_df),
+              ("genre",       dumpGenre,       movie_df),
+              ("keyword",     dumpKeyword,     movie_df),
+              ("contributor", dumpContributor, cast_df, crew_df, people_df),
+              ("person",      dumpPerson,      people_df, movie_df),
+              ("rating",      dumpRating,      movie_df),
+              ("awards",      dumpAwards,      people_df, movie_df),
+              ("place",       dumpPlace,       movie_df)]
+    if collaboration_edges:
+        stages.insert(4, ("collaboration", dumpCollaboration, cast_df, crew_df, people_df, movie_df))
+    runStages(stages)
+    if validation_mode != "off":
+        runStage("validate", validateGraph)
+    unpersistAll()
+    writeManifest()
+    writeReport(time.time() - start)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+An IVF-flat approximate nearest neighbour index over the embeddings saved by
+neptune_ml_utils.export_embeddings, for serving and testing cosine k-NN without
+an OpenSearch domain.
+
+The vectors are clustered with spherical k-means and stored grouped by their
+nearest centroid. A query is only compared with the vectors of its nprobe
+nearest lists, so nprobe trades recall for speed: nprobe=n_lists is an exact
+search. A saved index is a directory of .npy files that load() memory-maps.
+
+    index = IVFIndex.build(np.load("movie_embeddings.npy"), ids=np.load("movie_embeddings_ids.npy"))
+    index.save("movie_index")
+    index = IVFIndex.load("movie_index")
+    ids, scores = index.search_ids(index.vectors[:5], k=10, nprobe=8)
+
+    python ann_index.py --embeddings movie_embeddings.npy --output movie_index
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def assign(vectors, centroids, block_rows: int = 65536):
+    """
+    Index of the most cosine-similar centroid of every (normalized) vector
+    """
+    lists = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), block_rows):
+        block = normalize(vectors[start : start + block_rows])
+        lists[start : start + block_rows] = np.argmax(block @ centroids.T, axis=1)
+    return lists
+
+
+def kmeans(vectors, n_lists: int, iterations: int = 10, seed: int = 0):
+    """
+    Spherical k-means: unit centroids maximizing the cosine similarity of the
+    vectors assigned to them
+    """
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)]
+    for _ in range(iterations):
+        lists = assign(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, lists, vectors)
+        # Empty lists start over from a random vector
+        empty = np.bincount(lists, minlength=n_lists) == 0
+        sums[empty] = vectors[rng.choice(len(vectors), empty.sum(), replace=False)]
+        centroids = normalize(sums)
+    return centroids
+
+
+class IVFIndex:
+    def __init__(self, centroids, offsets, vectors, rows, ids=None):
+        # List l holds vectors[offsets[l] : offsets[l + 1]], the rows rows[...]
+        # of the embeddings the index was built from
+        self.centroids = centroids
+        self.offsets = offsets
+        self.vectors = vectors
+        self.rows = rows
+        self.ids = ids
+
+    @classmethod
+    def build(
+        cls,
+        embeddings: np.ndarray,
+        ids=None,
+        n_lists: int = None,
+        iterations: int = 10,
+        train_rows: int = 256,
+        dtype: str = "float32",
+        seed: int = 0,
+    ):
+        """
+        n_lists defaults to 4 * sqrt(n) lists. k-means is trained on at most
+        train_rows vectors per list, and the vectors are kept as float32 or
+        float16.
+        """
+        assert dtype in ["float32", "float16"], "Invalid vector dtype"
+        n = len(embeddings)
+        n_lists = min(n_lists or int(4 * np.sqrt(n)), n)
+        rng = np.random.default_rng(seed)
+        train = rng.choice(n, min(n, n_lists * train_rows), replace=False)
+        centroids = kmeans(
+            normalize(embeddings[np.sort(train)]), n_lists, iterations, seed
+        )
+
+        lists = assign(embeddings, centroids)
+        rows = np.argsort(lists, kind="stable")
+        offsets = np.concatenate(
+            [[0], np.cumsum(np.bincount(lists, minlength=n_lists))]
+        )
+        vectors = normalize(embeddings[rows]).astype(dtype)
+        return cls(
+            centroids,
+            offsets.astype(np.int64),
+            vectors,
+            rows.astype(np.int64),
+            None if ids is None else np.asarray(ids),
+        )
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: str = "r"):
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in ["centroids", "offsets", "vectors", "rows"]
+        }
+        ids_path = os.path.join(path, "ids.npy")
+        if os.path.exists(ids_path):
+            arrays["ids"] = np.load(ids_path)
+        return cls(**arrays)
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        for name in ["centroids", "offsets", "vectors", "rows", "ids"]:
+            if getattr(self, name) is not None:
+                np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(path, "index.json"), "w") as f:
+            json.dump(
+                {
+                    "vectors": len(self.vectors),
+                    "dimension": self.vectors.shape[1],
+                    "lists": len(self.centroids),
+                    "dtype": str(self.vectors.dtype),
+                },
+                f,
+            )
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    def search(self, queries, k: int = 10, nprobe: int = 8):
+        """
+        (rows, scores) of the k most cosine-similar vectors of every query,
+        best first, searching its nprobe nearest lists. Rows are those of the
+        embeddings the index was built from, -1 where fewer than k vectors
+        were probed.
+        """
+        queries = normalize(np.atleast_2d(queries))
+        nprobe = min(nprobe, self.n_lists)
+        probes = np.argpartition(-(queries @ self.centroids.T), nprobe - 1, axis=1)[
+            :, :nprobe
+        ]
+
+        # Candidate slot j * k : (j + 1) * k of a query holds its best k of its
+        # j-th probed list
+        scores = np.full((len(queries), nprobe * k), -np.inf, dtype=np.float32)
+        positions = np.full((len(queries), nprobe * k), -1, dtype=np.int64)
+        flat = np.argsort(probes, axis=None, kind="stable")
+        lists = probes.ravel()[flat]
+        bounds = np.searchsorted(lists, np.arange(self.n_lists + 1))
+        # Every list is compared with all the queries probing it at once
+        for i in np.flatnonzero(np.diff(bounds)):
+            query, slot = np.divmod(flat[bounds[i] : bounds[i + 1]], nprobe)
+            start, end = self.offsets[i], self.offsets[i + 1]
+            if start == end:
+                continue
+            list_scores = (
+                queries[query] @ np.asarray(self.vectors[start:end], dtype=np.float32).T
+            )
+            best = min(k, end - start)
+            if end - start > k:
+                top = np.argpartition(list_scores, -k, axis=1)[:, -k:]
+            else:
+                top = np.broadcast_to(np.arange(end - start), list_scores.shape)
+            columns = slot[:, None] * k + np.arange(best)
+            scores[query[:, None], columns] = np.take_along_axis(list_scores, top, 1)
+            positions[query[:, None], columns] = top + start
+
+        order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        positions = np.take_along_axis(positions, order, axis=1)
+        rows = np.where(positions >= 0, np.asarray(self.rows)[positions], -1)
+        return rows, np.take_along_axis(scores, order, axis=1)
+
+    def search_ids(self, queries, k: int = 10, nprobe: int = 8):
+        """
+        (ids, scores) of the k most cosine-similar vectors of every query, ""
+        where fewer than k vectors were probed
+        """
+        rows, scores = self.search(queries, k, nprobe)
+        return np.where(rows >= 0, self.ids[rows], ""), scores
+
+
+def exact_search(embeddings, queries, k: int = 10, query_rows: int = 64):
+    embeddings = normalize(embeddings)
+    rows = np.empty((len(queries), k), dtype=np.int64)
+    for start in range(0, len(queries), query_rows):
+        scores = normalize(queries[start : start + query_rows]) @ embeddings.T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(scores, top, 1), axis=1, kind="stable")
+        rows[start : start + query_rows] = np.take_along_axis(top, order, axis=1)
+    return rows
+
+
+def recall(rows, exact_rows):
+    """
+    Fraction of the exact neighbours found
+    """
+    k = exact_rows.shape[1]
+    return np.mean([len(np.intersect1d(r, e)) / k for r, e in zip(rows, exact_rows)])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--embeddings",
+        default="movie_embeddings.npy",
+        help="embeddings saved by export_embeddings, with the ~ids in <name>_ids.npy",
+    )
+    parser.add_argument("--output", default="movie_index")
+    parser.add_argument("--lists", type=int, default=None)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--dtype", default="float32", choices=["float32", "float16"])
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument(
+        "--queries", type=int, default=1000, help="random movies to measure recall on"
+    )
+    options = parser.parse_args()
+
+    embeddings = np.load(options.embeddings, mmap_mode="r")
+    ids_path = f"{os.path.splitext(options.embeddings)[0]}_ids.npy"
+    ids = np.load(ids_path) if os.path.exists(ids_path) else None
+
+    start = time.time()
+    index = IVFIndex.build(
+        embeddings, ids, options.lists, options.iterations, dtype=options.dtype
+    )
+    index.save(options.output)
+    print(
+        f"Indexed {len(embeddings):,} vectors in {index.n_lists:,} lists in {time.time() - start:.1f}s"
+    )
+
+    index = IVFIndex.load(options.output)
+    rng = np.random.default_rng(0)
+    n_queries = min(options.queries, len(embeddings))
+    queries = np.asarray(
+        embeddings[np.sort(rng.choice(len(embeddings), n_queries, replace=False))]
+    )
+    exact_rows = exact_search(embeddings, queries, options.k)
+    for nprobe in [1, 2, 4, 8, 16, 32, 64]:
+        if nprobe > index.n_lists:
+            break
+        start = time.time()
+        rows, _ = index.search(queries, options.k, nprobe)
+        seconds = time.time() - start
+        print(
+            f"nprobe {nprobe:>3}  recall@{options.k} {recall(rows, exact_rows):.3f}  {len(queries) / seconds:>10,.0f} queries/s"
+        )
@@ -0,0 +1,202 @@
+"""
+Builds the training graph straight from the node and edge CSVs written by
+part1-graph-creation/process_imdb_data.py, without cloning the Neptune cluster,
+for training outside of Neptune ML. Neptune ML's data processing job still reads
+the export-pg output, and nothing else in this repository reads these files.
+
+The load manifest the ETL writes next to the graph lists every label's files.
+The output directory holds:
+
+    graph.json                 node types with counts and global id offsets, and relations
+    node_ids/<ntype>.npy       the ~id of every node of a type, indexed by its local id
+    edges/<relation>.src.npy   int32 local source ids, one pair of arrays per
+    edges/<relation>.dst.npy   (source type, edge label, destination type)
+
+All arrays are plain .npy files that can be opened with mmap_mode="r". A node's
+global id, the row of its embedding, is the offset of its type plus its local id.
+
+    python export_training_data.py --manifest s3://<bucket>/imdb/load-manifest.json --output ./training-graph
+"""
+
+import argparse
+import io
+import json
+import os
+from urllib.parse import urlparse
+
+import boto3
+import numpy as np
+import pandas as pd
+
+
+def open_file(path: str):
+    if path.startswith("s3://"):
+        url = urlparse(path)
+        body = boto3.client("s3").get_object(
+            Bucket=url.netloc, Key=url.path.lstrip("/")
+        )["Body"]
+        return io.BytesIO(body.read())
+    # Paths listed by Hadoop on a local file system carry a file: scheme
+    return open(path[len("file:") :] if path.startswith("file:") else path, "rb")
+
+
+def read_manifest(path: str):
+    with open_file(path) as f:
+        return json.load(f)
+
+
+def read_columns(load: dict, columns: list):
+    frames = []
+    for file in load["files"]:
+        with open_file(file["path"]) as f:
+            frames.append(
+                pd.read_csv(
+                    f,
+                    usecols=columns,
+                    dtype=str,
+                    keep_default_na=False,
+                    # pandas only infers compression from a path, not a handle
+                    compression="gzip" if file["path"].endswith(".gz") else None,
+                )
+            )
+    if not frames:
+        return pd.DataFrame({column: pd.Series(dtype=str) for column in columns})
+    return pd.concat(frames, ignore_index=True)
+
+
+def relation_name(src: str, label: str, dst: str):
+    return f"{src}_{label}_{dst}"
+
+
+def export_training_data(manifest_path: str, output: str):
+    manifest = read_manifest(manifest_path)
+    node_loads = sorted(
+        (load for load in manifest["loads"] if load["name"].startswith("nodes/")),
+        key=lambda load: load["name"],
+    )
+    edge_loads = [
+        load for load in manifest["loads"] if load["name"].startswith("edges/")
+    ]
+
+    os.makedirs(os.path.join(output, "node_ids"), exist_ok=True)
+    os.makedirs(os.path.join(output, "edges"), exist_ok=True)
+
+    # Some labels repeat an ~id on several rows (a keyword in several categories)
+    ntypes, node_ids = [], []
+    for load in node_loads:
+        ids = pd.unique(read_columns(load, ["~id"])["~id"])
+        ntype = load["name"].split("/", 1)[1]
+        np.save(
+            os.path.join(output, "node_ids", f"{ntype}.npy"),
+            np.char.encode(ids.astype(str), "utf-8"),
+        )
+        ntypes.append(ntype)
+        node_ids.append(ids)
+
+    counts = np.array([len(ids) for ids in node_ids], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64)
+    all_ids = pd.Index(np.concatenate(node_ids) if node_ids else [])
+    if not all_ids.is_unique:
+        raise ValueError("The same ~id is used by nodes of different types")
+    if len(all_ids) >= 2**31:
+        raise ValueError(f"{len(all_ids)} nodes do not fit int32 ids")
+
+    relations, dangling = [], {}
+    for load in edge_loads:
+        edges = read_columns(load, ["~from", "~to", "~label"])
+        # One hash lookup per endpoint column, -1 for ids that are not a node
+        src = all_ids.get_indexer(edges["~from"])
+        dst = all_ids.get_indexer(edges["~to"])
+        found = (src >= 0) & (dst >= 0)
+        if not found.all():
+            dangling[load["name"]] = int((~found).sum())
+        src, dst, labels = src[found], dst[found], edges["~label"].to_numpy()[found]
+
+        src_type = np.searchsorted(offsets, src, side="right") - 1
+        dst_type = np.searchsorted(offsets, dst, side="right") - 1
+        label_codes, label_names = pd.factorize(labels)
+        groups = pd.DataFrame({"src": src_type, "label": label_codes, "dst": dst_type})
+        for (s, l, d), rows in groups.groupby(["src", "label", "dst"]).indices.items():
+            name = relation_name(ntypes[s], label_names[l], ntypes[d])
+            np.save(
+                os.path.join(output, "edges", f"{name}.src.npy"),
+                (src[rows] - offsets[s]).astype(np.int32),
+            )
+            np.save(
+                os.path.join(output, "edges", f"{name}.dst.npy"),
+                (dst[rows] - offsets[d]).astype(np.int32),
+            )
+            relations.append(
+                {
+                    "src": ntypes[s],
+                    "label": label_names[l],
+                    "dst": ntypes[d],
+                    "count": len(rows),
+                    "src_file": f"edges/{name}.src.npy",
+                    "dst_file": f"edges/{name}.dst.npy",
+                }
+            )
+
+    graph = {
+        "ntypes": [
+            {
+                "name": ntype,
+                "count": int(count),
+                "offset": int(offset),
+                "ids_file": f"node_ids/{ntype}.npy",
+            }
+            for ntype, count, offset in zip(ntypes, counts, offsets)
+        ],
+        "relations": sorted(relations, key=lambda r: (r["src"], r["label"], r["dst"])),
+        "dangling_edges": dangling,
+    }
+    with open(os.path.join(output, "graph.json"), "w") as f:
+        json.dump(graph, f, indent=2)
+    return graph
+
+
+def load_mapping(path: str):
+    """
+    The node2id / node2gid mapping of an exported graph, in the layout of the
+    mapping.info file of a Neptune ML training job.
+    """
+    with open(os.path.join(path, "graph.json")) as f:
+        graph = json.load(f)
+    node2id, node2gid = {}, {}
+    for ntype in graph["ntypes"]:
+        ids = np.load(os.path.join(path, ntype["ids_file"]), mmap_mode="r")
+        node2id[ntype["name"]] = {node_id.decode(): i for i, node_id in enumerate(ids)}
+        node2gid[ntype["name"]] = np.arange(
+            ntype["offset"], ntype["offset"] + ntype["count"]
+        )
+    return {"node2id": node2id, "node2gid": node2gid}
+
+
+def load_relation(path: str, relation: dict, mmap_mode: str = "r"):
+    return (
+        np.load(os.path.join(path, relation["src_file"]), mmap_mode=mmap_mode),
+        np.load(os.path.join(path, relation["dst_file"]), mmap_mode=mmap_mode),
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--manifest",
+        required=True,
+        help="local path or s3:// URI of load-manifest.json",
+    )
+    parser.add_argument("--output", default="./training-graph")
+    options = parser.parse_args()
+
+    graph = export_training_data(options.manifest, options.output)
+    for ntype in graph["ntypes"]:
+        print(f"{ntype['name']:<20} {ntype['count']:>12,} nodes")
+    for relation in graph["relations"]:
+        print(
+            f"{relation_name(relation['src'], relation['label'], relation['dst']):<48} {relation['count']:>12,} edges"
+        )
+    for name, count in graph["dangling_edges"].items():
+        print(
+            f"{name}: {count:,} edges with an endpoint that is not a node were skipped"
+        )
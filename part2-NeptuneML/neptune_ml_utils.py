@@ -1,4 +1,6 @@
+import asyncio
 import boto3
+import functools
 import pandas as pd
 import numpy as np
 import pickle
@@ -7,28 +9,142 @@ import requests
 import json
 import zipfile
 import logging
+import random
+import threading
 import time
 from time import strftime, gmtime, sleep
 from botocore.auth import SigV4Auth
 from botocore.awsrequest import AWSRequest
+from botocore.exceptions import NoCredentialsError
+from requests.adapters import HTTPAdapter
 from datetime import datetime
 from urllib.parse import urlparse
-from sagemaker.s3 import S3Downloader
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
 
 # How often to check the status
 UPDATE_DELAY_SECONDS = 15
 HOME_DIRECTORY = os.path.expanduser("~")
+# Artifacts larger than this are downloaded as concurrent ranged GETs
+DOWNLOAD_PART_BYTES = 64 * 1024 * 1024
+DOWNLOAD_THREADS = 16
+
+
+# Retry throttled (and briefly unavailable) requests with exponential backoff
+RETRY_STATUS_CODES = {429, 503}
+# Credentials are re-resolved when they are this close to expiring
+CREDENTIAL_REFRESH_SECONDS = 300
+
+
+class SignedClient:
+    """
+    SigV4 signing HTTP client that keeps its connections alive across requests
+    and resolves credentials only when the cached ones are about to expire.
+    verify is passed to requests, e.g. a CA bundle path for a local HTTPS stand-in.
+    """
+
+    def __init__(
+        self,
+        service="neptune-db",
+        region=None,
+        max_retries=5,
+        backoff_seconds=0.5,
+        pool_size=20,
+        verify=True,
+        boto_session=None,
+    ):
+        self.service = service
+        self.boto_session = boto_session or boto3.Session()
+        self.region = region or self.boto_session.region_name
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.verify = verify
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._credentials = None
+        self._expiry = 0
+        self._lock = threading.Lock()
+
+    def credentials(self):
+        with self._lock:
+            if time.time() > self._expiry - CREDENTIAL_REFRESH_SECONDS:
+                credentials = self.boto_session.get_credentials()
+                if credentials is None:
+                    raise NoCredentialsError()
+                self._credentials = credentials.get_frozen_credentials()
+                # Static credentials never expire, refreshable ones carry their expiry
+                expiry = getattr(credentials, "_expiry_time", None)
+                self._expiry = expiry.timestamp() if expiry else float("inf")
+            return self._credentials
+
+    def request(self, method, url, data=None, params=None, headers=None):
+        for attempt in range(self.max_retries + 1):
+            request = AWSRequest(
+                method=method, url=url, data=data, params=params, headers=headers
+            )
+            SigV4Auth(self.credentials(), self.service, self.region).add_auth(request)
+            # The signature covers the query string, so send the URL it was computed on
+            response = self.session.request(
+                method=method,
+                url=request.prepare().url,
+                headers=dict(request.headers),
+                data=data,
+                # Per request, as a CA bundle from the environment overrides session.verify
+                verify=self.verify,
+            )
+            if (
+                response.status_code not in RETRY_STATUS_CODES
+                or attempt == self.max_retries
+            ):
+                return response
+            retry_after = response.headers.get("Retry-After", "")
+            delay = (
+                float(retry_after)
+                if retry_after.isdigit()
+                else self.backoff_seconds * 2**attempt * random.uniform(0.5, 1.0)
+            )
+            logging.info(
+                "%s %s returned %s, retrying in %.1fs",
+                method,
+                url,
+                response.status_code,
+                delay,
+            )
+            sleep(delay)
+
+    async def request_async(self, method, url, data=None, params=None, headers=None):
+        """
+        request() on the default executor, so many requests can be awaited
+        together while sharing the same connection pool and credentials.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(self.request, method, url, data, params, headers)
+        )
+
+    def close(self):
+        self.session.close()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(service="neptune-db"):
+    with _clients_lock:
+        if service not in _clients:
+            _clients[service] = SignedClient(service)
+        return _clients[service]
 
 
 def signed_request(method, url, data=None, params=None, headers=None, service=None):
-    request = AWSRequest(
-        method=method, url=url, data=data, params=params, headers=headers
-    )
-    session = boto3.Session()
-    credentials = session.get_credentials()
     try:
-        frozen_creds = credentials.get_frozen_credentials()
-    except AttributeError:
+        return get_client(service).request(
+            method, url, data=data, params=params, headers=headers
+        )
+    except NoCredentialsError:
         print("Could not find valid IAM credentials in any the following locations:\n")
         print(
             "env, assume-role, assume-role-with-web-identity, sso, shared-credential-file, custom-process, "
@@ -38,11 +154,9 @@ def signed_request(method, url, data=None, params=None, headers=None, service=No
             "Go to https://boto3.amazonaws.com/v1/documentation/api/latest/guide/credentials.html for more "
             "details on configuring your IAM credentials."
         )
-        return request
-    SigV4Auth(frozen_creds, service, boto3.Session().region_name).add_auth(request)
-    return requests.request(
-        method=method, url=url, headers=dict(request.headers), data=data
-    )
+        return AWSRequest(
+            method=method, url=url, data=data, params=params, headers=headers
+        )
 
 
 def load_configuration():
@@ -80,22 +194,119 @@ Please configure the cluster according to the Amazpnm Neptune ML documentation b
         print("This Neptune cluster is configured to use Neptune ML")
 
 
-def get_neptune_ml_job_output_location(job_name: str, job_type: str):
-    assert job_type in [
-        "dataprocessing",
-        "modeltraining",
-        "modeltransform",
-    ], "Invalid neptune ml job type"
+NEPTUNE_ML_JOB_TYPES = ["dataprocessing", "modeltraining", "modeltransform"]
+# Statuses after which a Neptune ML job does not change anymore
+TERMINAL_JOB_STATUSES = {"Completed", "Failed", "Stopped"}
 
-    host, port, use_iam = load_configuration()
+
+def get_neptune_ml_job(job_name: str, job_type: str, endpoint: str = None):
+    assert job_type in NEPTUNE_ML_JOB_TYPES, "Invalid neptune ml job type"
+
+    if endpoint is None:
+        host, port, use_iam = load_configuration()
+        endpoint = f"https://{host}:{port}"
 
     response = signed_request(
         "GET",
         service="neptune-db",
-        url=f"https://{host}:{port}/ml/{job_type}/{job_name}",
+        url=f"{endpoint}/ml/{job_type}/{job_name}",
         headers={"content-type": "application/json"},
     )
-    result = json.loads(response.content.decode("utf-8"))
+    return json.loads(response.content.decode("utf-8"))
+
+
+class JobMonitor:
+    """
+    Waits for many Neptune ML jobs at once. Each job is polled on its own
+    schedule: every min_delay seconds at first, backing off by backoff up to
+    max_delay while its status stays the same, and again every min_delay after
+    it changes. on_complete(job_name, job_type, result) is called as soon as a
+    job reaches a terminal status; a job still running after its timeout is
+    reported with status "TimedOut", and one whose status cannot be read with
+    status "Failed" and the error.
+
+        monitor = JobMonitor()
+        monitor.add(dp_id, "dataprocessing")
+        for job in training_jobs:
+            monitor.add(job, "modeltraining", timeout=6 * 3600, on_complete=print)
+        results = await monitor.run()  # or monitor.wait() outside a notebook
+    """
+
+    def __init__(
+        self,
+        endpoint: str = None,
+        client: SignedClient = None,
+        min_delay: float = UPDATE_DELAY_SECONDS / 3,
+        max_delay: float = UPDATE_DELAY_SECONDS * 4,
+        backoff: float = 1.5,
+    ):
+        if endpoint is None:
+            host, port, use_iam = load_configuration()
+            endpoint = f"https://{host}:{port}"
+        self.endpoint = endpoint
+        self.client = client or get_client("neptune-db")
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.jobs = []
+
+    def add(
+        self, job_name: str, job_type: str, timeout: float = None, on_complete=None
+    ):
+        assert job_type in NEPTUNE_ML_JOB_TYPES, "Invalid neptune ml job type"
+        self.jobs.append((job_name, job_type, timeout, on_complete))
+        return self
+
+    async def status(self, job_name: str, job_type: str):
+        response = await self.client.request_async(
+            "GET",
+            f"{self.endpoint}/ml/{job_type}/{job_name}",
+            headers={"content-type": "application/json"},
+        )
+        response.raise_for_status()
+        return response.json()
+
+    async def poll(self, job_name: str, job_type: str):
+        delay, last = self.min_delay, None
+        while True:
+            result = await self.status(job_name, job_type)
+            if result["status"] in TERMINAL_JOB_STATUSES:
+                return result
+            if result["status"] != last:
+                logging.info(
+                    "Neptune ML %s job %s: %s", job_type, job_name, result["status"]
+                )
+                delay, last = self.min_delay, result["status"]
+            else:
+                delay = min(delay * self.backoff, self.max_delay)
+            await asyncio.sleep(delay)
+
+    async def watch(self, job_name: str, job_type: str, timeout: float, on_complete):
+        try:
+            result = await asyncio.wait_for(self.poll(job_name, job_type), timeout)
+        except asyncio.TimeoutError:
+            result = {"id": job_name, "status": "TimedOut"}
+        except requests.RequestException as e:
+            # e.g. a mistyped job id, which must not stop the other jobs' polling
+            logging.error("Neptune ML %s job %s: %s", job_type, job_name, e)
+            result = {"id": job_name, "status": "Failed", "error": str(e)}
+        if on_complete:
+            on_complete(job_name, job_type, result)
+        return result
+
+    async def run(self):
+        """
+        Returns {job_name: last status response} once every job finished or timed out.
+        """
+        results = await asyncio.gather(*[self.watch(*job) for job in self.jobs])
+        return {job[0]: result for job, result in zip(self.jobs, results)}
+
+    def wait(self):
+        return asyncio.run(self.run())
+
+
+def get_neptune_ml_job_output_location(job_name: str, job_type: str):
+    result = get_neptune_ml_job(job_name, job_type)
     if result["status"] != "Completed":
         logging.error(
             "Neptune ML {} job: {} is not completed".format(job_type, job_name)
@@ -104,41 +315,400 @@ def get_neptune_ml_job_output_location(job_name: str, job_type: str):
     return result["processingJob"]["outputLocation"]
 
 
+_output_locations = {}
+
+
 def get_modeltraining_job_output_location(training_job_name: str):
     assert (
         training_job_name is not None
     ), "Neptune ML training job name id should be passed, if training job s3 output is missing"
-    return get_neptune_ml_job_output_location(training_job_name, "modeltraining")
+    # A completed job's output never moves, look it up once per job
+    if training_job_name not in _output_locations:
+        location = get_neptune_ml_job_output_location(
+            training_job_name, "modeltraining"
+        )
+        if not location:
+            return
+        _output_locations[training_job_name] = location
+    return _output_locations[training_job_name]
+
+
+def get_s3_client(endpoint_url: str = None):
+    """
+    endpoint_url (or AWS_ENDPOINT_URL_S3) points the downloads at an S3
+    compatible stand-in when testing.
+    """
+    endpoint_url = endpoint_url or os.environ.get("AWS_ENDPOINT_URL_S3")
+    config = Config(
+        max_pool_connections=DOWNLOAD_THREADS,
+        s3={"addressing_style": "path"} if endpoint_url else {},
+    )
+    return boto3.client("s3", endpoint_url=endpoint_url, config=config)
+
+
+def download_artifact(s3_uri: str, local_path: str, s3_client=None):
+    """
+    Downloads s3_uri to local_path unless the copy there has the same ETag,
+    which is kept in a <local_path>.etag file next to it. Objects larger than
+    DOWNLOAD_PART_BYTES are fetched as concurrent ranged GETs.
+    """
+    s3_client = s3_client or get_s3_client()
+    url = urlparse(s3_uri)
+    bucket, key = url.netloc, url.path.lstrip("/")
+    head = s3_client.head_object(Bucket=bucket, Key=key)
+    etag, size = head["ETag"], head["ContentLength"]
+
+    etag_path = f"{local_path}.etag"
+    if os.path.exists(local_path) and os.path.getsize(local_path) == size:
+        if os.path.exists(etag_path) and open(etag_path).read() == etag:
+            return local_path
+
+    os.makedirs(os.path.dirname(local_path) or ".", exist_ok=True)
+    partial = f"{local_path}.partial"
+    with open(partial, "wb") as f:
+        f.truncate(size)
+
+    def download_range(start):
+        end = min(start + DOWNLOAD_PART_BYTES, size) - 1
+        # IfMatch fails the download if the object is replaced halfway through
+        body = s3_client.get_object(
+            Bucket=bucket, Key=key, Range=f"bytes={start}-{end}", IfMatch=etag
+        )["Body"]
+        with open(partial, "r+b") as f:
+            f.seek(start)
+            for chunk in body.iter_chunks(1024 * 1024):
+                f.write(chunk)
+
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_THREADS) as pool:
+        list(pool.map(download_range, range(0, size, DOWNLOAD_PART_BYTES)))
+
+    os.replace(partial, local_path)
+    with open(etag_path, "w") as f:
+        f.write(etag)
+    return local_path
 
 
 def get_embeddings(
-    training_job_name: str, download_location: str = "./model-artifacts"
+    training_job_name: str,
+    download_location: str = "./model-artifacts",
+    mmap_mode: str = None,
 ):
     training_job_s3_output = get_modeltraining_job_output_location(training_job_name)
     if not training_job_s3_output:
         return
 
     download_location = os.path.join(download_location, training_job_name)
-    os.makedirs(download_location, exist_ok=True)
-    # download embeddings and mapping info
-
-    S3Downloader.download(
-        os.path.join(training_job_s3_output, "embeddings/"),
-        os.path.join(download_location, "embeddings/"),
+    entity_emb = download_artifact(
+        os.path.join(training_job_s3_output, "embeddings", "entity.npy"),
+        os.path.join(download_location, "embeddings", "entity.npy"),
     )
 
-    entity_emb = np.load(os.path.join(download_location, "embeddings", "entity.npy"))
+    # mmap_mode="r" maps the file instead of reading every node type into memory
+    return np.load(entity_emb, mmap_mode=mmap_mode)
+
+
+class CompactMapping:
+    """
+    The node2id / node2gid maps of mapping.info as arrays instead of one dict
+    entry per node: for every node type its ~ids sorted as a fixed width byte
+    string array, the local id of each, and node2gid indexed by local id. Ids
+    are looked up in bulk with a binary search, and a saved mapping is
+    memory-mapped, so loading it does not depend on the number of nodes.
+    """
+
+    def __init__(self, types: dict):
+        # node type -> (sorted ids, local id of each sorted id, node2gid)
+        self.types = types
+
+    @classmethod
+    def from_mapping(cls, mapping: dict):
+        types = {}
+        for node_type, node2id in mapping["node2id"].items():
+            ids = np.char.encode(np.array(list(node2id.keys()), dtype=str), "utf-8")
+            local = np.fromiter(node2id.values(), dtype=np.int64, count=len(node2id))
+            order = np.argsort(ids, kind="stable")
+            node2gid = np.asarray(mapping["node2gid"][node_type], dtype=np.int64)
+            types[node_type] = (ids[order], local[order], node2gid)
+        return cls(types)
+
+    @classmethod
+    def load(cls, path: str):
+        with open(os.path.join(path, "types.json")) as f:
+            node_types = json.load(f)
+        return cls(
+            {
+                node_type: tuple(
+                    np.load(
+                        os.path.join(path, f"{node_type}.{name}.npy"), mmap_mode="r"
+                    )
+                    for name in ["ids", "local", "node2gid"]
+                )
+                for node_type in node_types
+            }
+        )
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        for node_type, arrays in self.types.items():
+            for name, array in zip(["ids", "local", "node2gid"], arrays):
+                np.save(os.path.join(path, f"{node_type}.{name}.npy"), array)
+        with open(os.path.join(path, "types.json"), "w") as f:
+            json.dump(list(self.types), f)
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for arrays in self.types.values() for array in arrays)
+
+    def local_ids(self, node_type: str, node_ids):
+        """
+        Local ids of node_ids, in order. Raises KeyError for unknown ids.
+        """
+        ids, local, _ = self.types[node_type]
+        keys = np.char.encode(np.asarray(node_ids, dtype=str), "utf-8")
+        positions = np.searchsorted(ids, keys)
+        found = positions < len(ids)
+        found[found] = ids[positions[found]] == keys[found]
+        if not found.all():
+            unknown = np.char.decode(keys[~found][:10], "utf-8").tolist()
+            raise KeyError(f"Unknown {node_type} ids: {unknown}")
+        return np.asarray(local[positions])
 
-    return entity_emb
+    def global_ids(self, node_type: str, node_ids):
+        return np.asarray(self.types[node_type][2][self.local_ids(node_type, node_ids)])
 
+    def items(self, node_type: str):
+        """
+        (ids, global ids) of every node of node_type, in local id order
+        """
+        ids, local, node2gid = self.types[node_type]
+        order = np.argsort(local, kind="stable")
+        return np.char.decode(ids[order], "utf-8"), np.asarray(node2gid[local[order]])
 
-def get_mapping(training_job_name: str, download_location: str = "./model-artifacts"):
+
+def get_mapping(
+    training_job_name: str,
+    download_location: str = "./model-artifacts",
+    compact: bool = True,
+):
+    """
+    The training job's node mapping, as a CompactMapping converted once and
+    kept in mapping/ next to mapping.info, or as the unpickled dicts with
+    compact=False.
+    """
     training_job_s3_output = get_modeltraining_job_output_location(training_job_name)
     if not training_job_s3_output:
         return
 
     download_location = os.path.join(download_location, training_job_name)
-    os.makedirs(download_location, exist_ok=True)
-    # download embeddings and mapping info
+    mapping = download_artifact(
+        os.path.join(training_job_s3_output, "mapping.info"),
+        os.path.join(download_location, "mapping.info"),
+    )
+
+    compact_path = os.path.join(download_location, "mapping")
+    etag_path = os.path.join(compact_path, "mapping.info.etag")
+    with open(f"{mapping}.etag") as f:
+        etag = f.read()
+    if compact and os.path.exists(etag_path) and open(etag_path).read() == etag:
+        return CompactMapping.load(compact_path)
+
+    with open(mapping, "rb") as f:
+        mapping = pickle.load(f)
+    if not compact:
+        return mapping
+
+    CompactMapping.from_mapping(mapping).save(compact_path)
+    with open(etag_path, "w") as f:
+        f.write(etag)
+    return CompactMapping.load(compact_path)
+
+
+def export_embeddings(
+    mapping,
+    entity_emb: np.ndarray,
+    output: str = "movie_embeddings",
+    node_type: str = "movie",
+    csv_path: str = None,
+    csv_format: str = "long",
+):
+    """
+    Gathers the embeddings of every node_type node with one indexing operation
+    through the mapping (a CompactMapping or the mapping.info dicts) and saves
+    them as a float32 matrix in <output>.npy, with the ~id of every row in
+    <output>_ids.npy.
+
+    csv_path also writes them as CSV: "long" is one ITEM_ID, KEY, VALUE row per
+    dimension, "list" one nodes, embedding row per node with the embedding as a
+    list, the file the OpenSearch loader in part 3 reads.
+    """
+    assert csv_format in ["long", "list"], "Invalid embeddings csv format"
+    if not isinstance(mapping, CompactMapping):
+        mapping = CompactMapping.from_mapping(mapping)
+
+    ids, global_ids = mapping.items(node_type)
+    embeddings = np.ascontiguousarray(entity_emb[global_ids], dtype=np.float32)
+
+    np.save(f"{output}.npy", embeddings)
+    np.save(f"{output}_ids.npy", ids)
+    if csv_path:
+        write_embeddings_csv(ids, embeddings, csv_path, csv_format)
+    return ids, embeddings
 
-    S3Downloader.download(training_job_s3_output, download_location)
+
+def write_embeddings_csv(
+    ids: np.ndarray, embeddings: np.ndarray, path: str, csv_format: str = "long"
+):
+    # Chunked so the long format never holds all rows x dimensions as Python objects
+    chunk_rows = 50000
+    dimensions = embeddings.shape[1]
+    for start in range(0, max(len(ids), 1), chunk_rows):
+        chunk_ids = ids[start : start + chunk_rows]
+        chunk = embeddings[start : start + chunk_rows]
+        if csv_format == "long":
+            df = pd.DataFrame(
+                {
+                    "ITEM_ID": np.repeat(chunk_ids, dimensions),
+                    "KEY": np.tile(np.arange(dimensions), len(chunk_ids)),
+                    "VALUE": chunk.ravel(),
+                },
+                index=np.arange(
+                    start * dimensions, (start + len(chunk_ids)) * dimensions
+                ),
+            )
+        else:
+            row_format = "[" + ", ".join(["%.8g"] * dimensions) + "]"
+            df = pd.DataFrame(
+                {
+                    "nodes": chunk_ids,
+                    "embedding": [row_format % tuple(row) for row in chunk.tolist()],
+                },
+                index=np.arange(start, start + len(chunk_ids)),
+            )
+        df.to_csv(path, mode="w" if start == 0 else "a", header=start == 0)
+
+
+class EmbeddingStore:
+    """
+    Node embeddings memory-mapped from entity.npy, or from a float16 / int8
+    copy of it written by save(), with rows looked up by node type and ~id
+    through the CompactMapping of the training job.
+
+        store = EmbeddingStore.from_training_job(training_job_name)
+        store.save("entity.int8.npy", dtype="int8")
+        small = EmbeddingStore.open("entity.int8.npy", store.mapping)
+        small.get("movie", ["tt0111161", "tt0068646"])
+        small.error(store)
+
+    int8 copies are quantized per dimension, symmetric around 0, with the
+    scales kept in <name>.scales.npy next to the array.
+    """
+
+    def __init__(self, embeddings: np.ndarray, mapping=None, scales=None):
+        self.embeddings = embeddings
+        if mapping is not None and not isinstance(mapping, CompactMapping):
+            mapping = CompactMapping.from_mapping(mapping)
+        self.mapping = mapping
+        self.scales = scales
+
+    @classmethod
+    def open(cls, path: str, mapping=None):
+        embeddings = np.load(path, mmap_mode="r")
+        scales = None
+        if embeddings.dtype == np.int8:
+            scales = np.load(cls.scales_path(path))
+        return cls(embeddings, mapping, scales)
+
+    @classmethod
+    def from_training_job(
+        cls, training_job_name: str, download_location: str = "./model-artifacts"
+    ):
+        embeddings = get_embeddings(training_job_name, download_location, mmap_mode="r")
+        return cls(embeddings, get_mapping(training_job_name, download_location))
+
+    @staticmethod
+    def scales_path(path: str):
+        return f"{path[:-len('.npy')] if path.endswith('.npy') else path}.scales.npy"
+
+    @property
+    def nbytes(self):
+        return self.embeddings.nbytes + (
+            self.scales.nbytes if self.scales is not None else 0
+        )
+
+    def rows(self, node_type: str, node_ids):
+        return self.mapping.global_ids(node_type, node_ids)
+
+    def dequantize(self, rows: np.ndarray):
+        if self.scales is not None:
+            return rows.astype(np.float32) * self.scales
+        return rows.astype(np.float32)
+
+    def get(self, node_type: str, node_ids):
+        """
+        float32 embeddings of node_ids, in order. Only these rows are read.
+        """
+        return self.get_rows(self.rows(node_type, node_ids))
+
+    def get_rows(self, rows):
+        # Fancy indexing reads pages in row order, which is faster on a mapped file
+        rows = np.asarray(rows)
+        order = np.argsort(rows, kind="stable")
+        result = np.empty((len(rows), self.embeddings.shape[1]), dtype=np.float32)
+        result[order] = self.dequantize(self.embeddings[rows[order]])
+        return result
+
+    def node_type(self, node_type: str):
+        """
+        (ids, float32 embeddings) of every node of node_type
+        """
+        ids, rows = self.mapping.items(node_type)
+        return ids, self.get_rows(rows)
+
+    def save(self, path: str, dtype: str = "float16", chunk_rows: int = 100000):
+        """
+        Writes a float32, float16 or int8 copy, a chunk at a time so the source
+        never has to fit in memory.
+        """
+        assert dtype in ["float32", "float16", "int8"], "Invalid embedding dtype"
+        n = len(self.embeddings)
+        chunks = range(0, n, chunk_rows)
+        scales = None
+        if dtype == "int8":
+            max_abs = np.zeros(self.embeddings.shape[1], dtype=np.float32)
+            for start in chunks:
+                chunk = self.dequantize(self.embeddings[start : start + chunk_rows])
+                max_abs = np.maximum(max_abs, np.abs(chunk).max(axis=0))
+            scales = np.where(max_abs > 0, max_abs / 127, 1).astype(np.float32)
+            np.save(self.scales_path(path), scales)
+
+        out = np.lib.format.open_memmap(
+            path, mode="w+", dtype=dtype, shape=self.embeddings.shape
+        )
+        for start in chunks:
+            chunk = self.dequantize(self.embeddings[start : start + chunk_rows])
+            if scales is not None:
+                chunk = np.clip(np.rint(chunk / scales), -127, 127)
+            out[start : start + chunk_rows] = chunk.astype(dtype)
+        out.flush()
+        del out
+        return EmbeddingStore.open(path, self.mapping)
+
+    def error(self, reference: "EmbeddingStore", sample: int = 10000, seed: int = 0):
+        """
+        How far this copy is from reference on a random sample of rows: size
+        ratio, largest absolute error and the cosine similarity between the
+        copy and the original vectors.
+        """
+        n = len(self.embeddings)
+        rows = np.random.default_rng(seed).choice(n, min(sample, n), replace=False)
+        approx, exact = self.get_rows(rows), reference.get_rows(rows)
+        cosine = (approx * exact).sum(axis=1) / (
+            np.linalg.norm(approx, axis=1) * np.linalg.norm(exact, axis=1) + 1e-12
+        )
+        return {
+            "bytes": int(self.nbytes),
+            "size_ratio": self.nbytes / reference.nbytes,
+            "max_abs_error": float(np.abs(approx - exact).max()),
+            "mean_cosine": float(cosine.mean()),
+            "min_cosine": float(cosine.min()),
+        }
@@ -0,0 +1,214 @@
+"""
+Computes the exact top-K cosine neighbours of every movie from the embeddings
+saved by neptune_ml_utils.export_embeddings, so the search Lambda of part 3 can
+read a movie's recommendations with one key lookup instead of a k-NN query.
+
+The similarity matrix is never materialised: a block of movies is multiplied
+with one block of the catalog at a time, and every row keeps only its best K
+candidates so far, which the scores of the next block have to beat. Blocks of
+movies are independent, and are spread over --processes worker processes,
+which memory-map the normalised embeddings instead of getting a copy each.
+
+    python precompute_recommendations.py --embeddings movie_embeddings.npy --output movie_recommendations --csv
+
+writes <output>_neighbors.npy (int32 rows of the embeddings, best first) and
+<output>_scores.npy (float32 cosine similarities), and with --csv
+<output>.csv with the ~id of every movie, the ~ids of its neighbours and
+their scores, for the OpenSearch loader of part 3.
+"""
+
+import argparse
+import csv
+import json
+import os
+import tempfile
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+_embeddings = None
+
+
+def normalize(embeddings: np.ndarray, chunk_rows: int = 100000):
+    normalized = np.empty(embeddings.shape, dtype=np.float32)
+    for start in range(0, len(embeddings), chunk_rows):
+        chunk = np.asarray(embeddings[start : start + chunk_rows], dtype=np.float32)
+        norms = np.linalg.norm(chunk, axis=1, keepdims=True)
+        normalized[start : start + chunk_rows] = chunk / np.maximum(norms, 1e-12)
+    return normalized
+
+
+def sort_top_k(scores, rows, k):
+    """
+    The k best of every row of (scores, rows), best first
+    """
+    if scores.shape[1] > k:
+        keep = np.argpartition(scores, -k, axis=1)[:, -k:]
+        scores = np.take_along_axis(scores, keep, axis=1)
+        rows = np.take_along_axis(rows, keep, axis=1)
+    order = np.argsort(-scores, axis=1, kind="stable")
+    return np.take_along_axis(scores, order, axis=1), np.take_along_axis(
+        rows, order, axis=1
+    )
+
+
+def merge_top_k(scores, rows, block_scores, block_start, k):
+    """
+    Merges block_scores, whose columns are the rows from block_start on, into
+    the running top k (scores, rows) of every query row, sorted best first.
+    """
+    n = len(scores)
+    if np.isneginf(scores[:, -1]).any():
+        columns = np.broadcast_to(
+            np.arange(block_start, block_start + block_scores.shape[1]),
+            block_scores.shape,
+        )
+        return sort_top_k(
+            np.concatenate([scores, block_scores], axis=1),
+            np.concatenate([rows, columns], axis=1),
+            k,
+        )
+
+    # Once every row has k candidates, only the few scores above a row's k-th
+    # best can change it, and a comparison is much cheaper than a selection
+    candidates = np.flatnonzero(block_scores.max(axis=1) > scores[:, -1])
+    query, column = np.nonzero(block_scores[candidates] > scores[candidates, -1:])
+    query = candidates[query]
+    if not len(query):
+        return scores, rows
+    all_query = np.concatenate([np.repeat(np.arange(n), k), query])
+    all_scores = np.concatenate([scores.ravel(), block_scores[query, column]])
+    all_rows = np.concatenate([rows.ravel(), column + block_start])
+    order = np.lexsort((-all_scores, all_query))
+    counts = np.bincount(all_query, minlength=n)
+    rank = np.arange(len(order)) - np.repeat(np.cumsum(counts) - counts, counts)
+    keep = order[rank < k]
+    return all_scores[keep].reshape(n, k), all_rows[keep].reshape(n, k)
+
+
+def top_k_block(embeddings, start, end, k, block_rows):
+    """
+    (scores, rows) of the k nearest neighbours of rows start:end, best first,
+    leaving out every row itself
+    """
+    queries = embeddings[start:end]
+    n = len(queries)
+    scores = np.full((n, k), -np.inf, dtype=np.float32)
+    rows = np.full((n, k), -1, dtype=np.int64)
+    for block_start in range(0, len(embeddings), block_rows):
+        block = embeddings[block_start : block_start + block_rows]
+        block_scores = queries @ block.T
+        # A movie is not its own recommendation
+        overlap = np.arange(max(start, block_start), min(end, block_start + len(block)))
+        block_scores[overlap - start, overlap - block_start] = -np.inf
+        scores, rows = merge_top_k(scores, rows, block_scores, block_start, k)
+    return scores, rows
+
+
+def _open_embeddings(path):
+    global _embeddings
+    _embeddings = np.load(path, mmap_mode="r")
+
+
+def _top_k_block(args):
+    return top_k_block(_embeddings, *args)
+
+
+def top_k_neighbors(
+    embeddings: np.ndarray,
+    k: int = 10,
+    query_rows: int = 512,
+    block_rows: int = 4096,
+    processes: int = 1,
+):
+    """
+    (neighbors, scores): the rows of the k most cosine-similar embeddings of
+    every embedding, best first, as int32, and their similarities
+    """
+    n = len(embeddings)
+    k = max(0, min(k, n - 1))
+    neighbors = np.empty((n, k), dtype=np.int32)
+    scores = np.empty((n, k), dtype=np.float32)
+    if not k:
+        return neighbors, scores
+    blocks = [
+        (start, min(start + query_rows, n), k, block_rows)
+        for start in range(0, n, query_rows)
+    ]
+
+    normalized = normalize(embeddings)
+    if processes <= 1:
+        results = (top_k_block(normalized, *block) for block in blocks)
+        for (start, end, _, _), (block_scores, block_neighbors) in zip(blocks, results):
+            scores[start:end], neighbors[start:end] = block_scores, block_neighbors
+        return neighbors, scores
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "normalized.npy")
+        np.save(path, normalized)
+        del normalized
+        with Pool(processes, initializer=_open_embeddings, initargs=(path,)) as pool:
+            results = pool.imap(_top_k_block, blocks)
+            for (start, end, _, _), (block_scores, block_neighbors) in zip(
+                blocks, results
+            ):
+                scores[start:end], neighbors[start:end] = block_scores, block_neighbors
+    return neighbors, scores
+
+
+def write_recommendations_csv(
+    ids, neighbors, scores, path: str, chunk_rows: int = 100000
+):
+    """
+    One row per movie: its ~id, and JSON lists of the ~ids of its neighbours
+    and of their scores
+    """
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["nodes", "recs", "scores"])
+        for start in range(0, len(ids), chunk_rows):
+            chunk_ids = ids[start : start + chunk_rows]
+            chunk_recs = ids[neighbors[start : start + chunk_rows]].tolist()
+            chunk_scores = np.round(
+                scores[start : start + chunk_rows].astype(np.float64), 4
+            ).tolist()
+            writer.writerows(
+                [node, json.dumps(recs), json.dumps(rec_scores)]
+                for node, recs, rec_scores in zip(chunk_ids, chunk_recs, chunk_scores)
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--embeddings",
+        default="movie_embeddings.npy",
+        help="embeddings saved by export_embeddings, with the ~ids in <name>_ids.npy",
+    )
+    parser.add_argument("--output", default="movie_recommendations")
+    parser.add_argument("-k", type=int, default=10, help="neighbours per movie")
+    parser.add_argument("--query-rows", type=int, default=512)
+    parser.add_argument("--block-rows", type=int, default=4096)
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--csv", action="store_true", help="also write <output>.csv")
+    options = parser.parse_args()
+
+    embeddings = np.load(options.embeddings, mmap_mode="r")
+    ids = np.load(f"{os.path.splitext(options.embeddings)[0]}_ids.npy")
+
+    start = time.time()
+    neighbors, scores = top_k_neighbors(
+        embeddings,
+        options.k,
+        options.query_rows,
+        options.block_rows,
+        options.processes,
+    )
+    print(
+        f"{len(ids):,} movies, {neighbors.shape[1]} neighbours each, in {time.time() - start:.1f}s"
+    )
+    np.save(f"{options.output}_neighbors.npy", neighbors)
+    np.save(f"{options.output}_scores.npy", scores)
+    if options.csv:
+        write_recommendations_csv(ids, neighbors, scores, f"{options.output}.csv")
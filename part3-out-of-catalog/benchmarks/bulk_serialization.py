@@ -0,0 +1,104 @@
+"""
+Serialization throughput and peak memory of the bulk bodies the
+LoadDataIntoOpenSearchLambda sends, for the byte-capped NDJSON encoder against
+the string concatenation it replaced (reproduced below as legacy_bodies).
+
+Run from this directory with the Lambda's requirements installed:
+
+    python bulk_serialization.py --movies 200000
+"""
+
+import argparse
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(
+    0,
+    os.path.join(
+        os.path.dirname(__file__), "../cdk/ooc/lambdas/LoadDataIntoOpenSearchLambda"
+    ),
+)
+import lambda_handler  # noqa: E402
+
+
+def make_movies(n, dimension=64, seed=0):
+    rng = np.random.default_rng(seed)
+    embeddings = rng.standard_normal((n, dimension)).astype(np.float32)
+    return [
+        {
+            "id": f"tt{i:07d}",
+            "embeddings": embeddings[i].tolist(),
+            "title": f'The "Movie" {i}',
+            "year": str(1950 + i % 70),
+            "poster": f"https://m.media-amazon.com/images/M/{i}.jpg",
+        }
+        for i in range(n)
+    ]
+
+
+def legacy_bodies(index_name, movies, batch=10000):
+    for start in range(0, len(movies), batch):
+        data = ""
+        for movie in movies[start : start + batch]:
+            data += (
+                '{ "index": { "_index": "'
+                + index_name
+                + '", "_id": "'
+                + movie["id"]
+                + '" } }\n'
+            )
+            data += (
+                '{ "year": '
+                + movie["year"]
+                + ', "poster": "'
+                + movie["poster"]
+                + '","embeddings": '
+                + str(movie["embeddings"])
+                + ', "title": "'
+                + movie["title"]
+                + '"}\n'
+            )
+        yield data
+
+
+def streaming_bodies(index_name, movies):
+    lines = lambda_handler.bulk_lines(index_name, movies, lambda_handler.encode_movie)
+    for chunk in lambda_handler.bulk_bodies(lines, lambda_handler.MAX_BULK_BYTES):
+        yield b"".join(chunk)
+
+
+def measure(name, make_bodies):
+    start = time.time()
+    requests, size = 0, 0
+    for body in make_bodies():
+        requests += 1
+        size += len(body)
+    seconds = time.time() - start
+
+    # A second pass, as tracing allocations slows the serialization down
+    tracemalloc.start()
+    for body in make_bodies():
+        pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(
+        f"{name:<10} {seconds:>7.2f}s {size / seconds / 1024 / 1024:>8.1f} MB/s "
+        f"{size / 1024 / 1024:>8.1f} MB in {requests:>4} requests, peak {peak / 1024 / 1024:>7.1f} MB"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--movies", type=int, default=200000)
+    parser.add_argument("--dimension", type=int, default=64)
+    options = parser.parse_args()
+
+    movies = make_movies(options.movies, options.dimension)
+    measure("legacy", lambda: legacy_bodies("ooc_knn", movies))
+    measure("streaming", lambda: streaming_bodies("ooc_knn", movies))
+    print(f"max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
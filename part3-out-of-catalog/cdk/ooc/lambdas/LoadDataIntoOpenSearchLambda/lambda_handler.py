@@ -1,10 +1,16 @@
 from opensearchpy import OpenSearch, RequestsHttpConnection
+from opensearchpy.exceptions import ConnectionError, TransportError
 from requests_aws4auth import AWS4Auth
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
 import boto3
 import os
 import json
+import numpy as np
 import pandas as pd
-import ast
+import random
+import threading
+import time
 import cfnresponse
 
 
@@ -71,110 +77,418 @@ def create_index(index, ops):
         print("opensearch index already exists")
 
 
-def post_request(index_name, movies, ops):
+# Bulk requests are cut at this many bytes rather than a number of documents
+MAX_BULK_BYTES = 5 * 1024 * 1024
+# Bulk requests sent at once, across all the indices being loaded
+BULK_WORKERS = int(os.environ.get("bulk_workers", "4"))
+# Statuses OpenSearch rejects a request or document with when it is overloaded
+RETRY_STATUSES = {429, 503}
+MAX_RETRIES = 6
+# Rows of the embedding and recommendation files read at a time
+CHUNK_ROWS = 50000
+
+_float_formats = {}
+
+
+def encode_floats(values):
     """
-    Bulk uploads text index documents
+    JSON array of float32 values with the 7 significant digits they hold,
+    instead of the 17 of str(list)
     """
-    data = ""
-    for movie in movies:
-        data += (
-            '{ "index": { "_index": "'
-            + index_name
-            + '", "_id": "'
-            + movie["id"]
-            + '" } }\n'
-        )
-        data += (
-            '{ "year": '
-            + movie["year"]
-            + ', "poster": "'
-            + movie["poster"]
-            + '","embeddings": '
-            + str(movie["embeddings"])
-            + ', "title": "'
-            + movie["title"]
-            + '" }\n '
-        )
+    n = len(values)
+    if n not in _float_formats:
+        _float_formats[n] = "[" + ",".join(["%.7g"] * n) + "]"
+    return _float_formats[n] % tuple(values)
 
-    response = ops.bulk(data)
-    return response
+
+def json_value(value):
+    # Missing CSV values come back from pandas as NaN, which is not JSON
+    if isinstance(value, float) and value != value:
+        return None
+    return value.item() if hasattr(value, "item") else value
 
 
-def post_request_emb(index_name, movies, ops):
+def encode_movie(movie):
     """
-    Bulk uploads knn index documents
+    Source of a movie document, for both the knn and the text index
+    """
+    year = json_value(movie["year"])
+    return '{"year":%s,"poster":%s,"embeddings":%s,"title":%s}' % (
+        json.dumps(None if year is None else int(year)),
+        json.dumps(json_value(movie["poster"])),
+        encode_floats(movie["embeddings"]),
+        json.dumps(json_value(movie["title"])),
+    )
+
+
+def encode_recs(movie):
+    return json.dumps({"recs": movie["recs"]}, separators=(",", ":"))
+
+
+def bulk_lines(index_name, movies, encode):
+    """
+    Yields the NDJSON action and source line of every movie, as bytes
     """
-    data = ""
     for movie in movies:
-        data += (
-            '{ "index": { "_index": "'
-            + index_name
-            + '", "_id": "'
-            + movie["id"]
-            + '" } }\n'
-        )
-        data += (
-            '{ "year": '
-            + movie["year"]
-            + ', "poster": "'
-            + movie["poster"]
-            + '","embeddings": '
-            + str(movie["embeddings"])
-            + ', "title": "'
-            + movie["title"]
-            + '"}\n'
-        )
+        yield (
+            '{"index":{"_index":%s,"_id":%s}}\n%s\n'
+            % (json.dumps(index_name), json.dumps(movie["id"]), encode(movie))
+        ).encode("utf-8")
 
-    response = ops.bulk(data)
-    return response
+
+def bulk_bodies(lines, max_bytes=MAX_BULK_BYTES):
+    """
+    Yields the lines of bulk requests of at most max_bytes, or of a single
+    document larger than that
+    """
+    chunk, size = [], 0
+    for line in lines:
+        if chunk and size + len(line) > max_bytes:
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(line)
+        size += len(line)
+    if chunk:
+        yield chunk
+
+
+def backoff(attempt, base=0.5, cap=30):
+    # Exponential, with jitter so that throttled workers do not retry in step
+    return min(cap, base * 2**attempt) * random.uniform(0.5, 1)
+
+
+class BulkSender:
+    """
+    Sends bulk requests from a pool of workers threads. submit() blocks while
+    max_in_flight requests are queued or running, so the documents are never
+    encoded much faster than OpenSearch takes them.
+
+    Documents rejected with a 429 or 503, or whose whole request was, are sent
+    again with exponential backoff, up to max_retries times. Every other
+    per-item error, and the documents still rejected after that, are kept in
+    failures, with the status of their last attempt, "connection_error" when
+    OpenSearch could not be reached.
+    """
+
+    def __init__(
+        self, ops, workers=BULK_WORKERS, max_in_flight=None, max_retries=MAX_RETRIES
+    ):
+        self.ops = ops
+        self.pool = ThreadPoolExecutor(workers)
+        self.slots = threading.BoundedSemaphore(max_in_flight or 2 * workers)
+        self.max_retries = max_retries
+        self.lock = threading.Lock()
+        self.futures = []
+        self.failures = []
+        self.indexed = Counter()
+        self.retried = Counter()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, index_name, lines):
+        self.slots.acquire()
+        try:
+            future = self.pool.submit(self.send, index_name, lines)
+        except Exception:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        with self.lock:
+            self.futures.append(future)
+
+    def send(self, index_name, lines):
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(backoff(attempt - 1))
+                with self.lock:
+                    self.retried[index_name] += len(lines)
+            try:
+                response = self.ops.bulk(body=b"".join(lines))
+            except (ConnectionError, TransportError) as e:
+                if isinstance(e, ConnectionError) or e.status_code in RETRY_STATUSES:
+                    status = (
+                        "connection_error"
+                        if isinstance(e, ConnectionError)
+                        else e.status_code
+                    )
+                    error = {"type": type(e).__name__, "reason": str(e)}
+                    # The last result of every document is the request's error
+                    results = [{"status": status, "error": error}] * len(lines)
+                    continue
+                raise
+            rejected, results = [], []
+            with self.lock:
+                for line, item in zip(lines, response["items"]):
+                    result = next(iter(item.values()))
+                    if result["status"] in RETRY_STATUSES:
+                        rejected.append(line)
+                        results.append(result)
+                    elif "error" in result:
+                        self.failures.append(self.failure(index_name, result))
+                    else:
+                        self.indexed[index_name] += 1
+            lines = rejected
+            if not lines:
+                return
+
+        with self.lock:
+            for line, result in zip(lines, results):
+                action = json.loads(line.split(b"\n", 1)[0])["index"]
+                self.failures.append(
+                    self.failure(index_name, {**result, "_id": action["_id"]})
+                )
+
+    @staticmethod
+    def failure(index_name, result):
+        return {
+            "index": index_name,
+            "id": result.get("_id"),
+            "status": result.get("status"),
+            "error": result.get("error"),
+        }
+
+    def close(self):
+        """
+        Waits for every request, raising the first unexpected error
+        """
+        try:
+            for future in self.futures:
+                future.result()
+        finally:
+            self.pool.shutdown()
+
+    def summary(self, index_name):
+        with self.lock:
+            failures = [f for f in self.failures if f["index"] == index_name]
+        return {
+            "index": index_name,
+            "indexed": self.indexed[index_name],
+            "retried": self.retried[index_name],
+            "failed": len(failures),
+            "failures": failures[:20],
+        }
+
+
+def post_bulk(index_name, movies, ops, encode=encode_movie, sender=None):
+    """
+    Streams movies to the index in bulk requests of at most MAX_BULK_BYTES
+    and returns a summary of the documents indexed and failed. With a sender
+    shared by several indices it returns None, as the requests may still be
+    running: its summary() is complete once it is closed.
+    """
+    if sender is None:
+        with BulkSender(ops) as sender:
+            post_bulk(index_name, movies, ops, encode, sender)
+        return sender.summary(index_name)
+
+    i = 0
+    for lines in bulk_bodies(bulk_lines(index_name, movies, encode), MAX_BULK_BYTES):
+        sender.submit(index_name, lines)
+        i += len(lines)
+        print(f"Processing line {i} of {index_name}")
+
+
+def post_request(index_name, movies, ops, sender=None):
+    """
+    Bulk uploads text index documents
+    """
+    return post_bulk(index_name, movies, ops, sender=sender)
 
 
-def ingest_data_into_ops(df, ops, ops_index="ooc_knn", post_method=post_request_emb):
+def post_request_emb(index_name, movies, ops, sender=None):
+    """
+    Bulk uploads knn index documents
     """
-    Batch input data and upload to index
-    :param df: Input data frame with movie embedding and metadata
+    return post_bulk(index_name, movies, ops, sender=sender)
+
+
+def ingest_data_into_ops(
+    movies, ops, ops_index="ooc_knn", post_method=post_request_emb, sender=None
+):
+    """
+    Stream input data to the index
+    :param movies: Movies with embedding and metadata, from merge_data
     :param ops: opensearch client
     :param ops_index: index name for opensearch
     :param post_method: name of the function that bulk uploads data to index
-    :return: upload response
-    """
-    movies, i = [], 1
-    for ids, tt_ids, embedding, name, _, year, poster in df.values:
-        movie = {
-            "id": tt_ids,
-            "embeddings": embedding,
-            "title": name,
+    :param sender: BulkSender shared with the ingestion of other indices
+    :return: upload summary, None with a sender
+    """
+    return post_method(ops_index, movies, ops, sender=sender)
+
+
+def post_request_recs(index_name, movies, ops, sender=None):
+    """
+    Bulk uploads precomputed recommendation documents
+    """
+    return post_bulk(index_name, movies, ops, encode=encode_recs, sender=sender)
+
+
+def ingest_recommendations_into_ops(
+    recommendations_file, metadata, ops, ops_index="ooc_recs", sender=None
+):
+    """
+    Denormalizes the metadata of every recommended movie into its document, so
+    the search Lambda reads a movie's recommendations with a single lookup
+    :param recommendations_file: Recommendations file from precompute_recommendations.py
+    :param metadata: Movie metadata by ~id, from read_metadata
+    :param ops: opensearch client
+    :param ops_index: index name for opensearch
+    :param sender: BulkSender shared with the ingestion of other indices
+    :return: upload summary, None with a sender
+    """
+
+    def rec(tt_id, score):
+        title, year, poster = metadata[tt_id]
+        return {
+            "id": tt_id,
+            "title": title,
             "year": str(year),
-            "poster": poster,
+            "poster": str(poster),
+            "score": score,
         }
-        movies.append(movie)
-        if i % 10000 == 0:
-            response = post_method(ops_index, movies, ops)
-            print(f"Processing line {i}")
-            movies = []
-        i += 1
-    response = post_method(ops_index, movies, ops)
 
-    return response
+    movies = (
+        {
+            "id": tt_id,
+            "recs": [
+                rec(tt_id, score)
+                for tt_id, score in zip(json.loads(recs), json.loads(scores))
+                if tt_id in metadata
+            ],
+        }
+        for chunk in pd.read_csv(
+            recommendations_file,
+            usecols=["nodes", "recs", "scores"],
+            chunksize=CHUNK_ROWS,
+        )
+        for tt_id, recs, scores in chunk[["nodes", "recs", "scores"]].values
+    )
+    return post_request_recs(ops_index, movies, ops, sender=sender)
 
 
-def merge_data(embedding_file, movie_node_file):
+def local_copy(path, directory="/tmp"):
     """
-    Merge metadata and embedding files
-    :param embedding_file: Embedding file from KG training from blogpost 2
-    :param movie_node_file: movie_node_file created for KG
-    :return:
-    """
-    embed_df = pd.read_csv(embedding_file)
-    embed_df["embedding"] = embed_df["embedding"].apply(lambda x: ast.literal_eval(x))
-    movie_df = pd.read_csv(movie_node_file)
-    merged_df = pd.merge(
-        embed_df,
-        movie_df[["name:String", "~id", "year:Int", "poster:String"]],
-        left_on="nodes",
-        right_on="~id",
+    Downloads an s3:// object to directory, to memory-map it
+    """
+    if not path.startswith("s3://"):
+        return path
+    bucket, key = path[len("s3://") :].split("/", 1)
+    local_path = os.path.join(directory, key.replace("/", "_"))
+    boto3.client("s3").download_file(bucket, key, local_path)
+    return local_path
+
+
+def movie_node_files(movie_node_file):
+    """
+    The CSV files of the movie nodes: movie_node_file itself, or the part files
+    in it when it is a directory or an s3:// prefix ending in /, such as the
+    nodes/movie/ output of the graph ETL
+    """
+    if movie_node_file.startswith("s3://") and movie_node_file.endswith("/"):
+        bucket, prefix = movie_node_file[len("s3://") :].split("/", 1)
+        pages = (
+            boto3.client("s3")
+            .get_paginator("list_objects_v2")
+            .paginate(Bucket=bucket, Prefix=prefix)
+        )
+        paths = [
+            f"s3://{bucket}/{item['Key']}"
+            for page in pages
+            for item in page.get("Contents", [])
+        ]
+    elif os.path.isdir(movie_node_file):
+        paths = [
+            os.path.join(movie_node_file, name) for name in os.listdir(movie_node_file)
+        ]
+    else:
+        return [movie_node_file]
+    return sorted(path for path in paths if os.path.basename(path).startswith("part-"))
+
+
+def read_metadata(movie_node_file):
+    """
+    (title, year, poster) of every movie by ~id
+    :param movie_node_file: movie_node_file created for KG, or the directory of
+        its part files, compressed or not
+    """
+    movie_df = pd.concat(
+        pd.read_csv(path, usecols=["~id", "name:String", "year:Int", "poster:String"])
+        for path in movie_node_files(movie_node_file)
+    )
+    return dict(
+        zip(
+            movie_df["~id"],
+            zip(
+                movie_df["name:String"], movie_df["year:Int"], movie_df["poster:String"]
+            ),
+        )
     )
-    return merged_df
+
+
+def read_embeddings(embedding_file, chunk_rows=CHUNK_ROWS):
+    """
+    Yields (~ids, embeddings) chunks of an embedding file:
+    - .npy, a float32 matrix saved by export_embeddings, with the ~id of every
+      row in <name>_ids.npy next to it
+    - .parquet, with a nodes column of ~ids and an embedding list column
+    - .csv, with nodes and embedding columns, the embeddings as list strings
+    Files on S3 in binary formats must have been copied locally by local_copy
+    """
+    if embedding_file.endswith(".npy"):
+        embeddings = np.load(embedding_file, mmap_mode="r")
+        ids = np.load(embedding_file[: -len(".npy")] + "_ids.npy", mmap_mode="r")
+        for start in range(0, len(ids), chunk_rows):
+            yield (
+                ids[start : start + chunk_rows].astype(str),
+                np.asarray(embeddings[start : start + chunk_rows], dtype=np.float32),
+            )
+    elif embedding_file.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(embedding_file).iter_batches(
+            batch_size=chunk_rows, columns=["nodes", "embedding"]
+        ):
+            embedding = batch.column("embedding")
+            yield (
+                batch.column("nodes").to_numpy(zero_copy_only=False),
+                embedding.flatten()
+                .to_numpy()
+                .astype(np.float32)
+                .reshape(len(embedding), -1),
+            )
+    else:
+        for chunk in pd.read_csv(
+            embedding_file, usecols=["nodes", "embedding"], chunksize=chunk_rows
+        ):
+            yield (
+                chunk["nodes"].to_numpy(),
+                np.array([json.loads(e) for e in chunk["embedding"]], dtype=np.float32),
+            )
+
+
+def merge_data(embedding_file, metadata):
+    """
+    Yields every movie of the embedding file that has metadata, with both, a
+    chunk of embeddings at a time
+    :param embedding_file: Embedding file from KG training from blogpost 2
+    :param metadata: Movie metadata by ~id, from read_metadata
+    """
+    for ids, embeddings in read_embeddings(embedding_file):
+        for tt_id, embedding in zip(ids, embeddings.tolist()):
+            if tt_id in metadata:
+                title, year, poster = metadata[tt_id]
+                yield {
+                    "id": tt_id,
+                    "embeddings": embedding,
+                    "title": title,
+                    "year": year,
+                    "poster": poster,
+                }
 
 
 # Lambda execution starts here
@@ -182,9 +496,13 @@ def lambda_handler(event, context):
 
     embedding_file = os.environ.get("embeddings_file")
     movie_node_file = os.environ.get("movie_node_file")
-    print("Merging files")
-    merged_df = merge_data(embedding_file, movie_node_file)
-    print("Embeddings and metadata files merged")
+    print("Reading the movie metadata")
+    metadata = read_metadata(movie_node_file)
+    if embedding_file.endswith((".npy", ".parquet")):
+        print("Downloading the embeddings")
+        if embedding_file.endswith(".npy"):
+            local_copy(embedding_file[: -len(".npy")] + "_ids.npy")
+        embedding_file = local_copy(embedding_file)
 
     print("Initializing OpenSearch client")
     ops = initialize_ops()
@@ -197,18 +515,53 @@ def lambda_handler(event, context):
     create_index("ooc_knn", ops)
     print("knn index created!")
 
-    print("Uploading the data for knn index")
-    response = ingest_data_into_ops(
-        merged_df, ops, ops_index="ooc_knn", post_method=post_request_emb
-    )
-    print(response)
-    print("Upload complete for knn index")
+    recommendations_file = os.environ.get("recommendations_file")
+    if recommendations_file:
+        if not ops.indices.exists(index="ooc_recs"):
+            ops.indices.create(index="ooc_recs")
 
-    print("Uploading the data for fuzzy word search index")
-    response = ingest_data_into_ops(
-        merged_df, ops, ops_index="ooc_text", post_method=post_request
-    )
-    print("Upload complete for fuzzy word search index")
+    # Both indices, and the recommendations, are filled at once, each with its
+    # own pass over the files, and their bulk requests sharing one pool of
+    # BULK_WORKERS connections
+    print("Uploading the data for knn and fuzzy word search indices")
+    with BulkSender(ops) as sender, ThreadPoolExecutor(3) as producers:
+        uploads = [
+            producers.submit(
+                ingest_data_into_ops,
+                merge_data(embedding_file, metadata),
+                ops,
+                "ooc_knn",
+                post_request_emb,
+                sender,
+            ),
+            producers.submit(
+                ingest_data_into_ops,
+                merge_data(embedding_file, metadata),
+                ops,
+                "ooc_text",
+                post_request,
+                sender,
+            ),
+        ]
+        if recommendations_file:
+            print("Uploading the precomputed recommendations")
+            uploads.append(
+                producers.submit(
+                    ingest_recommendations_into_ops,
+                    recommendations_file,
+                    metadata,
+                    ops,
+                    "ooc_recs",
+                    sender,
+                )
+            )
+        for upload in uploads:
+            upload.result()
+    for index_name in ["ooc_knn", "ooc_text"] + (
+        ["ooc_recs"] if recommendations_file else []
+    ):
+        print(json.dumps(sender.summary(index_name)))
+    print("Upload complete")
     # Create the response and add some extra content to support CORS
     response = {
         "statusCode": 200,
@@ -1,4 +1,5 @@
 from opensearchpy import OpenSearch, RequestsHttpConnection
+from opensearchpy.exceptions import NotFoundError
 from requests_aws4auth import AWS4Auth
 import boto3
 import os
@@ -6,6 +7,7 @@ import json
 
 index_name = "ooc_text"
 knn_index_name = "ooc_knn"
+recs_index_name = "ooc_recs"
 
 
 def initialize_ops():
@@ -50,6 +52,23 @@ def get_recommendations(embedding, recs_per_movie, es):
     return result["hits"]["hits"]
 
 
+def get_precomputed_recommendations(hits, es):
+    """
+    Precomputed neighbours of every hit by ~id, from one multi-get on the
+    recommendations index. Movies without a document are left out.
+    """
+    if not hits:
+        return {}
+    try:
+        result = es.mget(index=recs_index_name, body={"ids": [h["_id"] for h in hits]})
+    except NotFoundError:
+        # The index is only created when a recommendations file is loaded
+        return {}
+    return {
+        doc["_id"]: doc["_source"]["recs"] for doc in result["docs"] if doc["found"]
+    }
+
+
 def get_movies(search_text, num_movies, recs_per_movie, es):
     query = {
         "size": num_movies,
@@ -58,9 +77,18 @@ def get_movies(search_text, num_movies, recs_per_movie, es):
     }
     result = es.search(index=index_name, body=query)
 
+    hits = result["hits"]["hits"]
+    precomputed = get_precomputed_recommendations(hits, es)
     r = {"results": []}
-    for idx, h in enumerate(result["hits"]["hits"]):
-        rec = get_recommendations(h["_source"]["embeddings"], recs_per_movie, es)
+    for idx, h in enumerate(hits):
+        recs = precomputed.get(h["_id"], [])
+        if len(recs) >= recs_per_movie:
+            # Same shape as a k-NN result: the movie itself, then its neighbours
+            rec = [h] + [
+                {"_id": rec["id"], "_source": rec} for rec in recs[:recs_per_movie]
+            ]
+        else:
+            rec = get_recommendations(h["_source"]["embeddings"], recs_per_movie, es)
         rec_movies = [f"{r['_source']['title']} ({r['_source']['year']})" for r in rec]
         rec_id = [f"{r['_id']}" for r in rec]
         rec_poster = [f"{r['_source']['poster']}" for r in rec]
@@ -2,6 +2,7 @@ from aws_cdk import (
     Stack,
     RemovalPolicy,
     Duration,
+    Size,
     CfnOutput,
     CfnParameter,
     Fn,
@@ -29,7 +30,17 @@ class CdkOpenSearchStack(Stack):
             self, "embeddingsFile", type="String", description="embeddings"
         ).value_as_string
         movie_node_file = CfnParameter(
-            self, "movieNodeFile", type="String", description="movie nodes"
+            self,
+            "movieNodeFile",
+            type="String",
+            description="movie node file, or the s3:// prefix of its part files ending in /",
+        ).value_as_string
+        recommendations_file = CfnParameter(
+            self,
+            "recommendationsFile",
+            type="String",
+            default="",
+            description="precomputed recommendations, in the bucket of the embeddings file",
         ).value_as_string
 
         # Get bucket names from params for permissions
@@ -93,10 +104,14 @@ class CdkOpenSearchStack(Stack):
             handler="lambda_handler",
             runtime=_lambda.Runtime.PYTHON_3_8,
             vpc=vpc,
-            memory_size=10240,
+            # The embeddings are streamed from disk a chunk at a time, so only
+            # the movie metadata has to fit in memory
+            memory_size=2048,
+            ephemeral_storage_size=Size.gibibytes(2),
             environment={
                 "embeddings_file": embeddings_file,
                 "movie_node_file": movie_node_file,
+                "recommendations_file": recommendations_file,
                 "opensearch_url": es_domain.domain_endpoint,
             },
             timeout=Duration.minutes(15),
@@ -108,6 +123,8 @@ class CdkOpenSearchStack(Stack):
                 effect=iam.Effect.ALLOW,
                 actions=[
                     "s3:Get*",
+                    # read_metadata lists the part files of a movie node prefix
+                    "s3:ListBucket",
                 ],
                 resources=[
                     f"arn:aws:s3:::{bucket_name_emb_file}",
@@ -2,10 +2,11 @@
 
 echo "[START] OOC Stack"
 
-read -p "Enter the s3 location of your embeddings file : " embeddings_file
-read -p "Enter the s3 location of your movie node file : " movie_node_file
+read -p "Enter the s3 location of your embeddings file (.npy, .parquet or .csv) : " embeddings_file
+read -p "Enter the s3 location of your movie node file, or of its part files ending in / : " movie_node_file
+read -p "Enter the s3 location of your precomputed recommendations file (optional) : " recommendations_file
 
-embeddings_file="s3://<bucket-name>/path/embedding.csv"
+embeddings_file="s3://<bucket-name>/embeddings/movie_embeddings.npy"
 movie_node_file="s3://<bucket-name>/path/movie.csv"
 
 
@@ -13,4 +14,4 @@ cd cdk
 npx cdk bootstrap -a "python3 app.py" -v
 npx cdk synth -a "python3 app.py" -v
 
-npx cdk deploy -a "python3 app.py" --all --parameters  cdk-opensearch:embeddingsFile=$embeddings_file --parameters cdk-opensearch:movieNodeFile=$movie_node_file
\ No newline at end of file
+npx cdk deploy -a "python3 app.py" --all --parameters  cdk-opensearch:embeddingsFile=$embeddings_file --parameters cdk-opensearch:movieNodeFile=$movie_node_file --parameters cdk-opensearch:recommendationsFile=$recommendations_file
\ No newline at end of file